@@ -0,0 +1,99 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.urls import URLPattern
+from rest_framework.exceptions import NotFound
+
+from recipes.models import Ingredient, Tag
+
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        safe=False,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')}
+    )
+
+
+def not_found():
+    return json_response({'detail': str(NotFound.default_detail)}, 404)
+
+
+async def tag_list(request):
+    """ Асинхронный список Тэгов """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    return json_response(
+        [tag async for tag in Tag.objects.values(*TAG_FIELDS)]
+    )
+
+
+async def tag_detail(request, pk):
+    """ Асинхронное получение Тэга """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    tag = await Tag.objects.values(*TAG_FIELDS).filter(pk=pk).afirst()
+    return json_response(tag) if tag else not_found()
+
+
+async def ingredient_list(request):
+    """ Асинхронный список Ингредиентов с поиском по началу названия """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    ingredients = Ingredient.objects.values(*INGREDIENT_FIELDS)
+    name = request.GET.get('name')
+    if name:
+        ingredients = ingredients.filter(name__istartswith=name)
+    return json_response([ingredient async for ingredient in ingredients])
+
+
+async def ingredient_detail(request, pk):
+    """ Асинхронное получение Ингредиента """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    ingredient = await Ingredient.objects.values(
+        *INGREDIENT_FIELDS
+    ).filter(pk=pk).afirst()
+    return json_response(ingredient) if ingredient else not_found()
+
+
+def run_in_thread_pool(view):
+    """
+    Синхронный DRF-вью для ASGI, выполняемый в общем пуле потоков.
+    По умолчанию Django запускает синхронные вью в одном потоке на
+    воркер, поэтому медленные запросы выстраиваются в очередь.
+    """
+    def sync_view(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    async def async_view(request, *args, **kwargs):
+        return await sync_to_async(sync_view, thread_sensitive=False)(
+            request, *args, **kwargs
+        )
+
+    async_view.csrf_exempt = getattr(view, 'csrf_exempt', False)
+    return async_view
+
+
+def offload_urlpatterns(urlpatterns, names):
+    """ Переводим указанные маршруты роутера в пул потоков """
+    return [
+        URLPattern(
+            pattern.pattern,
+            run_in_thread_pool(pattern.callback),
+            pattern.default_args,
+            pattern.name
+        ) if pattern.name in names else pattern
+        for pattern in urlpatterns
+    ]
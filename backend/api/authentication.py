@@ -0,0 +1,29 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+
+def get_token_cache_key(key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'auth-token:{digest}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену, которая хранит пару (пользователь, токен)
+    в кеше AUTH_TOKEN_CACHE_TIMEOUT секунд, чтобы не ходить в БД на
+    каждом запросе. Запись сбрасывается при удалении токена (выход) и
+    сохранении пользователя (смена пароля, блокировка).
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = get_token_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(
+                cache_key, credentials, settings.AUTH_TOKEN_CACHE_TIMEOUT
+            )
+        return credentials
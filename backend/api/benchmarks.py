@@ -0,0 +1,168 @@
+import statistics
+import time
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.authentication import CachedTokenAuthentication
+from api.filters import RecipeFilter
+from api.renderers import FastJSONRenderer
+from api.representations import RECIPE_FIELDS, represent_recipes
+from api.seeding import IMAGE
+from api.serializers import (RecipeCreateUpdateSerializer,
+                             RecipeListRetrieveSerializer,
+                             SubscriptionListSerializer)
+from api.views import RecipeViewSet
+from recipes.models import Ingredient, Recipe, Tag, User
+
+
+def measure(func, repeat):
+    """ Время выполнения в мс: минимум, медиана и среднее по повторам """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+    }
+
+
+def get_recipe_queryset():
+    view = RecipeViewSet()
+    view.action = 'retrieve'
+    view.request = None
+    return view.get_queryset()
+
+
+def make_request(user, path='/api/recipes/', data=None):
+    request = Request(APIRequestFactory().get(path, data))
+    request.user = user
+    return request
+
+
+def serialize_recipes(user, count):
+    request = make_request(user)
+
+    def run():
+        recipes = get_recipe_queryset()[:count]
+        return RecipeListRetrieveSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+    return run
+
+
+def represent_recipe_rows(user, count):
+    request = make_request(user)
+
+    def run():
+        rows = Recipe.objects.values(*RECIPE_FIELDS)[:count]
+        return FastJSONRenderer().render(represent_recipes(rows, request))
+    return run
+
+
+def serialize_subscriptions(user, count):
+    request = make_request(user, data={'recipes_limit': 3})
+
+    def run():
+        authors = User.objects.all()[:count]
+        return SubscriptionListSerializer(
+            authors, many=True, context={'request': request}
+        ).data
+    return run
+
+
+def validate_recipe(user, ingredients):
+    request = make_request(user)
+    payload = {
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 10}
+            for ingredient_id in Ingredient.objects.values_list(
+                'id', flat=True)[:ingredients]
+        ],
+        'tags': list(Tag.objects.values_list('id', flat=True)[:3]),
+        'image': IMAGE,
+        'name': 'Рецепт',
+        'text': 'Текст',
+        'cooking_time': 10,
+    }
+
+    def run():
+        serializer = RecipeCreateUpdateSerializer(
+            data=payload, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+    return run
+
+
+def build_filter(user, data):
+    request = make_request(user, data=data)
+
+    def run():
+        return str(RecipeFilter(
+            request.query_params, Recipe.objects.all(), request=request
+        ).qs.query)
+    return run
+
+
+def toggle_favorite(user, authentication_class):
+    """ Добавление и удаление рецепта из избранного с токеном в заголовке """
+    token, _ = Token.objects.get_or_create(user=user)
+    recipe = Recipe.objects.exclude(recipe_favorites__user=user).first()
+    view = RecipeViewSet.as_view(
+        {'post': 'favorite', 'delete': 'favorite_delete'},
+        authentication_classes=(authentication_class,)
+    )
+    factory = APIRequestFactory()
+    path = f'/api/recipes/{recipe.id}/favorite/'
+    authorization = f'Token {token.key}'
+
+    def run():
+        view(factory.post(path, HTTP_AUTHORIZATION=authorization),
+             pk=recipe.id)
+        view(factory.delete(path, HTTP_AUTHORIZATION=authorization),
+             pk=recipe.id)
+    return run
+
+
+def get_cases(user):
+    """ Набор замеров: название и функция без аргументов """
+    slugs = list(Tag.objects.values_list('slug', flat=True)[:3])
+    cases = [
+        (f'RecipeListRetrieveSerializer x{count}',
+         serialize_recipes(user, count))
+        for count in (6, 100, 1000)
+    ]
+    cases += [
+        (f'represent_recipes + FastJSONRenderer x{count}',
+         represent_recipe_rows(user, count))
+        for count in (6, 100, 1000)
+    ]
+    cases += [
+        (f'SubscriptionListSerializer x{count}',
+         serialize_subscriptions(user, count))
+        for count in (6, 100)
+    ]
+    cases += [
+        (f'RecipeCreateUpdateSerializer validate {count} ingredients',
+         validate_recipe(user, count))
+        for count in (10, 50, 200)
+    ]
+    cases += [
+        ('RecipeFilter tags', build_filter(user, {'tags': slugs})),
+        ('RecipeFilter tags+favorited+cart', build_filter(user, {
+            'tags': slugs, 'is_favorited': 1, 'is_in_shopping_cart': 1,
+        })),
+    ]
+    cases += [
+        (f'favorite toggle {authentication_class.__name__}',
+         toggle_favorite(user, authentication_class))
+        for authentication_class in (
+            TokenAuthentication, CachedTokenAuthentication
+        )
+    ]
+    return cases
@@ -0,0 +1,101 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core import signing
+from rest_framework import exceptions, status
+
+from api.representations import RECIPE_FIELDS, represent_recipes
+from recipes.changelog import collect_changes, get_change_state
+from recipes.models import ChangeLog, Recipe
+
+CURSOR_SALT = 'api.changes'
+RELATION_KINDS = {
+    'favorites': ChangeLog.Kind.FAVORITE,
+    'shopping_cart': ChangeLog.Kind.SHOPPING_CART,
+    'subscriptions': ChangeLog.Kind.SUBSCRIPTION,
+}
+
+
+class CursorExpired(exceptions.APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = (
+        'Изменения с этого момента уже удалены, нужна полная синхронизация'
+    )
+    default_code = 'cursor_expired'
+
+
+def make_cursor(change_id, gaps=()):
+    """
+    Курсор хранит ID последней записи журнала, время выдачи и пропуски
+    в ID до нее, которые надо перечитать в следующий раз.
+    """
+    return signing.dumps(
+        [change_id, int(time.time()), list(gaps)],
+        salt=CURSOR_SALT, compress=True
+    )
+
+
+def read_cursor(cursor):
+    """ ID последней записи и пропуски; курсор без пропусков тоже верен """
+    try:
+        change_id, issued_at, *gaps = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise exceptions.ValidationError({'since': 'Неверный курсор'})
+    keep = datetime.timedelta(days=settings.CHANGES_KEEP_DAYS)
+    if time.time() - issued_at > keep.total_seconds():
+        raise CursorExpired
+    return change_id, gaps[0] if gaps else []
+
+
+def split_actions(changes):
+    return {
+        'added': [
+            object_id for object_id, action in changes.items()
+            if action == ChangeLog.Action.SAVED
+        ],
+        'removed': [
+            object_id for object_id, action in changes.items()
+            if action == ChangeLog.Action.DELETED
+        ],
+    }
+
+
+def get_changes(request, since=None):
+    """
+    Изменения рецептов и связей текущего пользователя после курсора since.
+    Без курсора возвращается только курсор текущего момента, данные
+    клиент загружает обычными списками.
+    """
+    user = request.user if request.user.is_authenticated else None
+    if since is None:
+        changes = {kind: {} for kind in ChangeLog.Kind.values}
+        (last_id, gaps), has_more = get_change_state(), False
+    else:
+        changes, last_id, gaps, has_more = collect_changes(
+            user, *read_cursor(since), settings.CHANGES_PAGE_SIZE
+        )
+    recipe_changes = changes[ChangeLog.Kind.RECIPE]
+    saved_ids = [
+        recipe_id for recipe_id, action in recipe_changes.items()
+        if action == ChangeLog.Action.SAVED
+    ]
+    recipes = represent_recipes(
+        Recipe.objects.visible().filter(
+            id__in=saved_ids
+        ).order_by('id').values(*RECIPE_FIELDS), request
+    ) if saved_ids else []
+    found_ids = {recipe['id'] for recipe in recipes}
+    data = {
+        'next': make_cursor(last_id, gaps),
+        'has_more': has_more,
+        'recipes': recipes,
+        'deleted_recipes': sorted(
+            recipe_id for recipe_id in recipe_changes
+            if recipe_id not in found_ids
+        ),
+    }
+    if user is not None:
+        for name, kind in RELATION_KINDS.items():
+            data[name] = split_actions(changes[kind])
+    return data
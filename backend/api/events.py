@@ -0,0 +1,214 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections
+from rest_framework import exceptions
+
+from api.authentication import CachedTokenAuthentication
+from core.pubsub import get_broker, publish
+from recipes.models import Subscription, User
+
+TICKET_SALT = 'api.events'
+
+
+def get_user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def get_author_channel(author_id):
+    return f'author:{author_id}'
+
+
+def publish_new_recipe(recipe):
+    publish(get_author_channel(recipe.author_id), {
+        'type': 'new_recipe',
+        'id': recipe.id,
+        'author_id': recipe.author_id,
+        'name': recipe.name,
+    })
+
+
+def publish_cart_changed(user_id, recipe_id, action):
+    publish(get_user_channel(user_id), {
+        'type': 'cart_changed',
+        'recipe_id': recipe_id,
+        'action': action,
+    })
+
+
+def publish_subscription_changed(follower_id, author_id, action):
+    publish(get_user_channel(follower_id), {
+        'type': 'subscription_changed',
+        'author_id': author_id,
+        'action': action,
+    })
+
+
+def make_ticket(user_id):
+    """
+    Билет на поток событий вместо токена в адресе: EventSource в браузере
+    не умеет передавать заголовки, а адрес с параметрами попадает
+    в журналы доступа. Билет живет EVENTS_TICKET_SECONDS секунд.
+    """
+    return signing.dumps(user_id, salt=TICKET_SALT)
+
+
+def read_ticket(ticket):
+    try:
+        return signing.loads(
+            ticket, salt=TICKET_SALT, max_age=settings.EVENTS_TICKET_SECONDS
+        )
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed(
+            'Неверный или просроченный билет'
+        )
+
+
+def get_credentials(scope):
+    """
+    Билет из параметра ticket или токен из заголовка Authorization
+    для клиентов, которые умеют передавать заголовки.
+    """
+    ticket = parse_qs(scope['query_string'].decode()).get('ticket')
+    if ticket:
+        return None, ticket[0]
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            keyword, _, key = value.decode().partition(' ')
+            if keyword == CachedTokenAuthentication.keyword:
+                return key.strip(), None
+    return None, None
+
+
+def load_stream_state(token=None, ticket=None):
+    """ ID пользователя и ID авторов, на которых он подписан """
+    close_old_connections()
+    try:
+        if ticket is not None:
+            user = User.objects.filter(
+                id=read_ticket(ticket), is_active=True
+            ).first()
+            if user is None:
+                raise exceptions.AuthenticationFailed(
+                    'Пользователь не найден или неактивен'
+                )
+        else:
+            user, _ = CachedTokenAuthentication().authenticate_credentials(
+                token
+            )
+        return user.id, list(Subscription.objects.filter(
+            follower=user
+        ).values_list('author_id', flat=True))
+    finally:
+        close_old_connections()
+
+
+def format_event(message):
+    data = json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+    return f'event: {message["type"]}\ndata: {data}\n\n'.encode()
+
+
+async def send_json(send, status, detail):
+    body = json.dumps({'detail': detail}, ensure_ascii=False).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_events(send, subscription):
+    """
+    Отправляет события подписки, а в тишине комментарий-пинг раз
+    в EVENTS_HEARTBEAT секунд, чтобы прокси не закрывали соединение.
+    """
+    await send({'type': 'http.response.body', 'body': (
+        f'retry: {settings.EVENTS_RETRY_MS}\n\n'.encode()
+    ), 'more_body': True})
+    while True:
+        try:
+            channel, message = await asyncio.wait_for(
+                subscription.get(), settings.EVENTS_HEARTBEAT
+            )
+        except asyncio.TimeoutError:
+            body = b': ping\n\n'
+        else:
+            # Подписки меняются и в других вкладках клиента
+            if message['type'] == 'subscription_changed':
+                author_channel = get_author_channel(message['author_id'])
+                if message['action'] == 'added':
+                    subscription.add(author_channel)
+                else:
+                    subscription.remove(author_channel)
+            body = format_event(message)
+        await send({
+            'type': 'http.response.body', 'body': body, 'more_body': True
+        })
+
+
+async def events_app(scope, receive, send):
+    """
+    Поток Server-Sent Events текущего пользователя: новые рецепты
+    авторов из подписок и изменения списка покупок. Соединение в покое
+    занимает только очередь в event loop, без потока и соединения с БД.
+    """
+    if scope['method'] != 'GET':
+        return await send_json(send, 405, 'Метод не разрешен')
+    token, ticket = get_credentials(scope)
+    if token is None and ticket is None:
+        return await send_json(
+            send, 401, str(exceptions.NotAuthenticated.default_detail)
+        )
+    try:
+        user_id, author_ids = await sync_to_async(
+            load_stream_state, thread_sensitive=False
+        )(token, ticket)
+    except exceptions.AuthenticationFailed as error:
+        return await send_json(send, 401, str(error.detail))
+    subscription = get_broker().subscribe()
+    subscription.add(
+        get_user_channel(user_id), *map(get_author_channel, author_ids)
+    )
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        disconnected = asyncio.ensure_future(wait_disconnect(receive))
+        streaming = asyncio.ensure_future(stream_events(send, subscription))
+        try:
+            await asyncio.wait(
+                (disconnected, streaming),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            disconnected.cancel()
+            streaming.cancel()
+        if streaming.done() and not streaming.cancelled():
+            streaming.result()
+    finally:
+        subscription.close()
+
+
+def with_events(application):
+    """ ASGI-приложение Django с потоком событий на EVENTS_PATH """
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == settings.EVENTS_PATH:
+            return await events_app(scope, receive, send)
+        return await application(scope, receive, send)
+    return router
@@ -0,0 +1,95 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from api.recipe_cache import get_versions
+from recipes.models import Recipe, TagsRecipes
+
+FACETS_VERSION_KEY = 'recipe-version:facets'
+# Параметры, которые не меняют набор рецептов
+IGNORED_PARAMS = ('page', 'limit', 'facets', 'fields')
+# Фильтры по данным пользователя: такие фасеты не кешируются
+USER_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_cooking_time_buckets():
+    """ Интервалы времени приготовления: подпись и верхняя граница """
+    buckets = []
+    lower = 0
+    for upper in settings.RECIPE_COOKING_TIME_BUCKETS:
+        buckets.append((f'{lower}-{upper}', upper))
+        lower = upper + 1
+    buckets.append((f'{lower}+', None))
+    return buckets
+
+
+def count_facets(recipes):
+    """
+    Два сгруппированных запроса по отфильтрованным рецептам: по тэгам
+    и по паре автор и интервал времени приготовления.
+    """
+    recipe_ids = recipes.values('id')
+    buckets = get_cooking_time_buckets()
+    tags = dict(TagsRecipes.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('tag__slug').annotate(
+        count=Count('recipe_id', distinct=True)
+    ).order_by('tag__slug'))
+    bucket_counts = [0] * len(buckets)
+    author_counts = {}
+    for author_id, bucket, count in Recipe.objects.filter(
+        id__in=recipe_ids
+    ).annotate(bucket=Case(
+        *[
+            When(cooking_time__lte=upper, then=Value(index))
+            for index, (_, upper) in enumerate(buckets[:-1])
+        ],
+        default=Value(len(buckets) - 1),
+        output_field=IntegerField()
+    )).values_list('author_id', 'bucket').annotate(
+        count=Count('id')
+    ).order_by():
+        bucket_counts[bucket] += count
+        author_counts[author_id] = author_counts.get(author_id, 0) + count
+    authors = sorted(
+        author_counts.items(), key=lambda item: (-item[1], item[0])
+    )[:settings.RECIPE_FACET_AUTHORS]
+    return {
+        'tags': tags,
+        'cooking_time': [
+            {'bucket': label, 'count': count}
+            for (label, _), count in zip(buckets, bucket_counts)
+        ],
+        'authors': [
+            {'id': author_id, 'count': count}
+            for author_id, count in authors
+        ],
+    }
+
+
+def get_facets(recipes, request):
+    """
+    Фасеты из кеша по сигнатуре фильтров или посчитанные заново. Кеш
+    используется только общий: смену версии фасетов в локальном кеше
+    другие воркеры не увидят.
+    """
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        if name not in IGNORED_PARAMS
+        for value in values
+    )
+    if not settings.SHARED_CACHE or any(
+        name in USER_PARAMS for name, _ in params
+    ):
+        return count_facets(recipes)
+    signature = hashlib.sha256(repr(params).encode()).hexdigest()[:32]
+    version, = get_versions([FACETS_VERSION_KEY])
+    key = f'recipe-facets:{version}:{signature}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = count_facets(recipes)
+        cache.set(key, facets, settings.RECIPE_FACETS_CACHE_TIMEOUT)
+    return facets
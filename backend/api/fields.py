@@ -0,0 +1,60 @@
+from rest_framework import serializers
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Первичный ключ, объект которого берется из загруженных заранее.
+    Список загружает объекты всех элементов одним запросом через
+    preload(), а не по запросу на элемент.
+    """
+    preloaded = None
+
+    def get_pk(self, data):
+        if isinstance(data, bool):
+            return None
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            return None
+
+    def preload(self, values):
+        pks = {pk for pk in map(self.get_pk, values) if pk is not None}
+        self.preloaded = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        if self.preloaded is None:
+            return super().to_internal_value(data)
+        pk = self.get_pk(data)
+        if pk is None:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = self.preloaded.get(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+class PreloadedManyRelatedField(serializers.ManyRelatedField):
+    """ Список первичных ключей, проверенный одним запросом """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child_relation.preload(data)
+        return super().to_internal_value(data)
+
+
+class PreloadedListSerializer(serializers.ListSerializer):
+    """
+    Список вложенных объектов, поля-ключи которых загружаются одним
+    запросом на поле для всех элементов.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            items = [item for item in data if isinstance(item, dict)]
+            for field in self.child.fields.values():
+                if isinstance(field, PreloadedPrimaryKeyRelatedField):
+                    field.preload(
+                        item[field.field_name] for item in items
+                        if field.field_name in item
+                    )
+        return super().to_internal_value(data)
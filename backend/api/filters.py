@@ -23,6 +23,12 @@ class RecipeFilter(rest_framework.FilterSet):
     is_in_shopping_cart = rest_framework.NumberFilter(
         method='filter_shopping_cart'
     )
+    cooking_time_min = rest_framework.NumberFilter(
+        field_name='cooking_time', lookup_expr='gte'
+    )
+    cooking_time_max = rest_framework.NumberFilter(
+        field_name='cooking_time', lookup_expr='lte'
+    )
 
     def filter_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
@@ -44,5 +50,7 @@ class RecipeFilter(rest_framework.FilterSet):
             'author',
             'tags',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'cooking_time_min',
+            'cooking_time_max',
         ]
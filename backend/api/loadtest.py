@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from django.test import Client
+
+from recipes.models import Recipe, Tag, User
+
+# Профили нагрузки: вес, метка маршрута, метод, шаблон адреса, авторизация
+PROFILES = {
+    'mixed': (
+        (30, 'recipes-list', 'get', '/api/recipes/?page={page}', False),
+        (10, 'recipes-list tags', 'get',
+         '/api/recipes/?tags={tag}&page={page}', False),
+        (20, 'recipes-detail', 'get', '/api/recipes/{recipe}/', True),
+        (8, 'recipes-list is_favorited', 'get',
+         '/api/recipes/?is_favorited=1', True),
+        (5, 'recipes-feed', 'get', '/api/recipes/feed/', True),
+        (5, 'users-current-user-subscriptions', 'get',
+         '/api/users/subscriptions/?recipes_limit=3', True),
+        (5, 'users-detail', 'get', '/api/users/{author}/', True),
+        (5, 'tags-list', 'get', '/api/tags/', False),
+        (5, 'ingredients-list', 'get',
+         '/api/ingredients/?name={ingredient}', False),
+        (4, 'recipes-favorite', 'post', '/api/recipes/{recipe}/favorite/',
+         True),
+        (4, 'recipes-favorite delete', 'delete',
+         '/api/recipes/{recipe}/favorite/', True),
+        (2, 'recipes-download-shopping-cart', 'get',
+         '/api/recipes/download_shopping_cart/', True),
+    ),
+    'favorites': (
+        (50, 'recipes-favorite', 'post', '/api/recipes/{recipe}/favorite/',
+         True),
+        (50, 'recipes-favorite delete', 'delete',
+         '/api/recipes/{recipe}/favorite/', True),
+    ),
+    'read': (
+        (50, 'recipes-list', 'get', '/api/recipes/?page={page}', False),
+        (40, 'recipes-detail', 'get', '/api/recipes/{recipe}/', True),
+        (10, 'tags-list', 'get', '/api/tags/', False),
+    ),
+    # Маршруты, которые под ASGI обслуживаются асинхронными вью
+    'async-read': (
+        (40, 'recipes-list', 'get', '/api/recipes/?page={page}', False),
+        (30, 'recipes-detail', 'get', '/api/recipes/{recipe}/', True),
+        (10, 'tags-list', 'get', '/api/tags/', False),
+        (10, 'ingredients-list', 'get',
+         '/api/ingredients/?name={ingredient}', False),
+        (10, 'users-current-user-subscriptions', 'get',
+         '/api/users/subscriptions/?recipes_limit=3', True),
+    ),
+}
+
+
+def percentile(values, percent):
+    """ Перцентиль по ближайшему рангу """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, int(round(percent / 100 * len(ordered) + 0.5)) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class TrafficSource:
+    """ Случайные параметры запросов с перекосом в сторону популярного """
+
+    def __init__(self, prefix, seed):
+        self.rng = random.Random(seed)
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.author_ids = list(
+            User.objects.filter(username__startswith=prefix).values_list(
+                'id', flat=True)
+        )
+        self.tokens = list(
+            User.objects.filter(
+                username__startswith=prefix,
+                auth_token__isnull=False
+            ).values_list('auth_token__key', flat=True)
+        )
+        self.tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        self.pages = max(1, len(self.recipe_ids) // 6)
+
+    def zipf_choice(self, values):
+        index = min(
+            int(self.rng.paretovariate(1.2)) - 1, len(values) - 1
+        )
+        return values[index]
+
+    def params(self):
+        return {
+            'recipe': self.zipf_choice(self.recipe_ids),
+            'author': self.zipf_choice(self.author_ids),
+            'tag': self.zipf_choice(self.tag_slugs),
+            'page': self.zipf_choice(range(1, self.pages + 1)),
+            'ingredient': self.rng.choice('абвгдежзиклмнопрст'),
+        }
+
+
+class LoadRunner:
+    """ Воспроизводит профиль нагрузки в несколько потоков """
+
+    def __init__(self, profile, target=None, concurrency=8, duration=30,
+                 prefix='bench', seed=0):
+        self.profile = PROFILES[profile]
+        self.target = target.rstrip('/') if target else None
+        self.concurrency = concurrency
+        self.duration = duration
+        self.source = TrafficSource(prefix, seed)
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def make_sender(self):
+        if self.target:
+            session = requests.Session()
+
+            def send(method, url, token):
+                headers = {'Authorization': f'Token {token}'} if token else {}
+                return session.request(
+                    method, self.target + url, headers=headers
+                ).status_code
+        else:
+            client = Client()
+
+            def send(method, url, token):
+                headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if (
+                    token) else {}
+                return getattr(client, method)(url, **headers).status_code
+        return send
+
+    def worker(self, deadline, seed):
+        rng = random.Random(seed)
+        send = self.make_sender()
+        weights = [item[0] for item in self.profile]
+        while time.monotonic() < deadline:
+            _, label, method, template, auth = rng.choices(
+                self.profile, weights
+            )[0]
+            with self.lock:
+                url = template.format(**self.source.params())
+            token = rng.choice(self.source.tokens) if auth else None
+            started = time.perf_counter()
+            try:
+                status = send(method, url, token)
+            except requests.RequestException:
+                status = 'error'
+            elapsed = (time.perf_counter() - started) * 1000
+            with self.lock:
+                self.samples[label].append(elapsed)
+                self.statuses[label][str(status)] += 1
+
+    def run(self):
+        deadline = time.monotonic() + self.duration
+        threads = [
+            threading.Thread(target=self.worker, args=(deadline, number))
+            for number in range(self.concurrency)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.monotonic() - started)
+
+    def report(self, elapsed):
+        routes = {}
+        for label, samples in sorted(self.samples.items()):
+            routes[label] = {
+                'requests': len(samples),
+                'rps': round(len(samples) / elapsed, 2),
+                'p50_ms': round(percentile(samples, 50), 2),
+                'p95_ms': round(percentile(samples, 95), 2),
+                'p99_ms': round(percentile(samples, 99), 2),
+                'statuses': dict(self.statuses[label]),
+            }
+        total = sum(len(samples) for samples in self.samples.values())
+        return {
+            'target': self.target or 'in-process',
+            'concurrency': self.concurrency,
+            'duration_s': round(elapsed, 2),
+            'requests': total,
+            'rps': round(total / elapsed, 2),
+            'routes': routes,
+        }
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.benchmarks import get_cases, measure
+from api.seeding import Rollback, seed_data
+
+
+class Command(BaseCommand):
+    help = 'Benchmark serializers and filters on seeded data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--filter', default='')
+        parser.add_argument('--output', help='Файл для сохранения JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and str(
+            connection.settings_dict['NAME']
+        ) == ':memory:':
+            call_command('migrate', verbosity=0)
+        results = {}
+        try:
+            with transaction.atomic():
+                users, _ = seed_data(users=100, recipes=1000)
+                for name, func in get_cases(users[0]):
+                    if options['filter'] in name:
+                        results[name] = measure(func, options['repeat'])
+                        self.stdout.write(
+                            f'{name:55} '
+                            f'min {results[name]["min_ms"]:>10} мс  '
+                            f'median {results[name]["median_ms"]:>10} мс'
+                        )
+                raise Rollback
+        except Rollback:
+            pass
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
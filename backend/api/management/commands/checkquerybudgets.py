@@ -0,0 +1,223 @@
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.changes import make_cursor
+from api.seeding import IMAGE, Rollback, seed_data
+from recipes.feed import backfill_feed
+from recipes.models import Ingredient, Recipe, Tag, User
+
+# Бюджет маршрута не зависит от размера страницы и числа ингредиентов
+# рецепта: рост запросов вместе с ними — это N+1
+BUDGETS = {
+    'recipes-list anonymous': 5,
+    'recipes-list': 8,
+    'recipes-list is_favorited': 8,
+    'recipes-list fields': 4,
+    'recipes-list ids': 7,
+    'recipes-list facets': 10,
+    'recipes-detail': 7,
+    # Запись кеша сверяется с updated_at рецепта в БД
+    'recipes-detail cached': 4,
+    'recipes-detail fields': 2,
+    'recipes-create': 13,
+    'recipes-update': 18,
+    'recipes-delete': 12,
+    'recipes-favorite': 5,
+    'recipes-favorite delete': 4,
+    'recipes-shopping-cart': 5,
+    'recipes-shopping-cart delete': 4,
+    'recipes-download-shopping-cart': 1,
+    'recipes-feed': 9,
+    'users-list': 1,
+    'users-list page': 2,
+    'users-list search': 1,
+    'users-detail': 2,
+    'users-me': 1,
+    'users-current-user-subscriptions': 4,
+    'users-current-user-subscriptions fields': 2,
+    'users-subscribe': 10,
+    'users-subscribe delete': 5,
+    # Чужие записи журнала между своими проверяются как пропуски
+    'recipes-changes': 9,
+    'tags-list': 1,
+    'tags-detail': 1,
+    'ingredients-list': 1,
+    'ingredients-detail': 1,
+}
+
+# Поля карточки рецепта в мобильном клиенте
+CARD_FIELDS = 'id,name,image,cooking_time,author'
+
+
+class Command(BaseCommand):
+    help = 'Check SQL query budgets of API routes on seeded data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', default='6,20,50')
+        parser.add_argument('--users', type=int, default=30)
+        parser.add_argument('--recipes', type=int, default=200)
+
+    def recipe_payload(self, size):
+        return {
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in Ingredient.objects.values_list(
+                    'id', flat=True)[:size]
+            ],
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'image': IMAGE,
+            'name': 'Проверка бюджета',
+            'text': 'Текст',
+            'cooking_time': 10,
+        }
+
+    def get_cases(self, user, size):
+        """ Запросы для проверки: метка, метод, адрес, тело, объектов """
+        recipe = Recipe.objects.exclude(author=user).first()
+        own_recipe = Recipe.objects.filter(author=user).first()
+        free_recipe = Recipe.objects.exclude(
+            recipe_favorites__user=user
+        ).exclude(recipe_shopping_carts__user=user).first()
+        author = User.objects.exclude(id=user.id).exclude(
+            author_subscriptions__follower=user
+        ).first()
+        payload = self.recipe_payload(size)
+        return (
+            ('recipes-list anonymous', 'get',
+             f'/api/recipes/?limit={size}', None),
+            ('recipes-list', 'get', f'/api/recipes/?limit={size}', None),
+            ('recipes-list is_favorited', 'get',
+             f'/api/recipes/?limit={size}&is_favorited=1', None),
+            ('recipes-list ids', 'get', '/api/recipes/?ids={}'.format(
+                ','.join(map(str, Recipe.objects.values_list(
+                    'id', flat=True
+                )[:size]))
+            ), None),
+            ('recipes-list facets', 'get',
+             f'/api/recipes/?limit={size}&facets=1&cooking_time_max=60',
+             None),
+            ('recipes-list fields', 'get',
+             f'/api/recipes/?limit={size}&fields={CARD_FIELDS}', None),
+            ('recipes-detail', 'get', f'/api/recipes/{recipe.id}/', None),
+            ('recipes-detail cached', 'get',
+             f'/api/recipes/{recipe.id}/', None),
+            ('recipes-detail fields', 'get',
+             f'/api/recipes/{recipe.id}/?fields={CARD_FIELDS}', None),
+            ('recipes-create', 'post', '/api/recipes/', payload),
+            ('recipes-update', 'patch',
+             f'/api/recipes/{own_recipe.id}/', payload),
+            ('recipes-favorite', 'post',
+             f'/api/recipes/{free_recipe.id}/favorite/', None),
+            ('recipes-favorite delete', 'delete',
+             f'/api/recipes/{free_recipe.id}/favorite/', None),
+            ('recipes-shopping-cart', 'post',
+             f'/api/recipes/{free_recipe.id}/shopping_cart/', None),
+            ('recipes-shopping-cart delete', 'delete',
+             f'/api/recipes/{free_recipe.id}/shopping_cart/', None),
+            ('recipes-download-shopping-cart', 'get',
+             '/api/recipes/download_shopping_cart/', None),
+            ('recipes-feed', 'get',
+             f'/api/recipes/feed/?limit={size}', None),
+            ('recipes-changes', 'get',
+             f'/api/recipes/changes/?since={make_cursor(0)}', None),
+            ('users-list', 'get', f'/api/users/?limit={size}', None),
+            ('users-list page', 'get', f'/api/users/?page=1&limit={size}',
+             None),
+            ('users-list search', 'get',
+             f'/api/users/?limit={size}&search=user', None),
+            ('users-detail', 'get', f'/api/users/{author.id}/', None),
+            ('users-me', 'get', '/api/users/me/', None),
+            ('users-current-user-subscriptions', 'get',
+             f'/api/users/subscriptions/?limit={size}&recipes_limit=3',
+             None),
+            ('users-current-user-subscriptions fields', 'get',
+             f'/api/users/subscriptions/?limit={size}&fields=id,username',
+             None),
+            ('users-subscribe', 'post',
+             f'/api/users/{author.id}/subscribe/', None),
+            ('users-subscribe delete', 'delete',
+             f'/api/users/{author.id}/subscribe/', None),
+            ('tags-list', 'get', '/api/tags/', None),
+            ('tags-detail', 'get',
+             f'/api/tags/{Tag.objects.first().id}/', None),
+            ('ingredients-list', 'get',
+             '/api/ingredients/?name=seed-ingredient-1', None),
+            ('ingredients-detail', 'get',
+             f'/api/ingredients/{Ingredient.objects.first().id}/', None),
+            ('recipes-delete', 'delete',
+             f'/api/recipes/{own_recipe.id}/', None),
+        )
+
+    def count_objects(self, label, response, data):
+        if data is not None:
+            return len(data['ingredients'])
+        if label.startswith('recipes-detail'):
+            return 1
+        if response.status_code != 200 or 'json' not in response.get(
+            'Content-Type', ''
+        ):
+            return 0
+        content = response.json()
+        if isinstance(content, dict):
+            return len(content.get('results', ()))
+        return len(content)
+
+    def check_routes(self, user, size):
+        client = APIClient()
+        client.force_authenticate(user=user, token=user.auth_token)
+        anonymous = APIClient()
+        results = []
+        for label, method, url, data in self.get_cases(user, size):
+            requester = anonymous if label.endswith('anonymous') else client
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(requester, method)(url, data, 'json')
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{label}: {response.status_code} {response.content}'
+                )
+            objects = self.count_objects(label, response, data)
+            results.append((
+                label, size, objects, len(queries), BUDGETS[label]
+            ))
+        return results
+
+    def handle(self, *args, **options):
+        page_sizes = [int(size) for size in options['page_sizes'].split(',')]
+        results = []
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, QUERY_BUDGET_STRICT=False,
+            SLOW_QUERY_LOG=False
+        ):
+            try:
+                with transaction.atomic():
+                    users, _ = seed_data(
+                        users=options['users'], recipes=options['recipes']
+                    )
+                    for author_id in users[0].author_followers.values_list(
+                        'author_id', flat=True
+                    ):
+                        backfill_feed(users[0].id, author_id)
+                    for size in page_sizes:
+                        try:
+                            with transaction.atomic():
+                                results += self.check_routes(users[0], size)
+                                raise Rollback
+                        except Rollback:
+                            pass
+                    raise Rollback
+            except Rollback:
+                pass
+        failures = 0
+        for label, size, objects, queries, budget in results:
+            status = 'OK' if queries <= budget else 'FAIL'
+            failures += status == 'FAIL'
+            self.stdout.write(
+                f'{status:4} {label:40} limit={size:<4} '
+                f'objects={objects:<4} queries={queries:<4} budget={budget}'
+            )
+        if failures:
+            raise CommandError(f'Превышен бюджет запросов: {failures}')
@@ -0,0 +1,139 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.loadtest import PROFILES, LoadRunner
+
+
+def parse_target(value):
+    """ Цель вида имя=адрес или просто адрес, который служит и именем """
+    name, separator, url = value.partition('=')
+    if not separator or '://' in name:
+        return value, value
+    return name, url
+
+
+class Command(BaseCommand):
+    help = 'Replay a traffic profile against the API and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', default=[],
+            help=(
+                'Адрес сервера, без него запросы выполняются в процессе. '
+                'Можно повторить в виде имя=адрес, например '
+                'wsgi=http://localhost:8000 asgi=http://localhost:8001: '
+                'цели прогоняются по очереди и сравниваются'
+            )
+        )
+        parser.add_argument(
+            '--profile', default='mixed', choices=sorted(PROFILES)
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для сохранения JSON')
+        parser.add_argument('--compare', help='JSON предыдущего прогона')
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def run_target(self, target, options):
+        return LoadRunner(
+            options['profile'],
+            target=target,
+            concurrency=options['concurrency'],
+            duration=options['duration'],
+            prefix=options['prefix'],
+            seed=options['seed']
+        ).run()
+
+    def handle(self, *args, **options):
+        targets = [parse_target(value) for value in options['target']]
+        if len(targets) > 1:
+            result = {
+                'targets': {
+                    name: self.run_target(url, options)
+                    for name, url in targets
+                }
+            }
+        else:
+            result = self.run_target(
+                targets[0][1] if targets else None, options
+            )
+        result.update({
+            'profile': options['profile'],
+            'commit': self.get_commit(),
+            'created_at': timezone.now().isoformat(),
+        })
+        if 'targets' in result:
+            self.write_comparison(result['targets'])
+        else:
+            self.write_result(result, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, ensure_ascii=False, indent=2)
+
+    def write_result(self, result, compare):
+        previous = {}
+        if compare:
+            with open(compare) as file:
+                previous = json.load(file)['routes']
+        self.stdout.write(
+            f'{result["requests"]} запросов, {result["rps"]} rps'
+        )
+        for label, route in result['routes'].items():
+            line = (
+                f'{label:36} {route["rps"]:>8} rps  '
+                f'p50 {route["p50_ms"]:>8} мс  p95 {route["p95_ms"]:>8} мс  '
+                f'p99 {route["p99_ms"]:>8} мс  {route["statuses"]}'
+            )
+            if label in previous:
+                delta = route['p95_ms'] - previous[label]['p95_ms']
+                line += f'  Δp95 {delta:+.2f} мс'
+            self.stdout.write(line)
+
+    def write_comparison(self, results):
+        """
+        Прогоны целей рядом: пропускная способность и p95 по маршрутам
+        и их отношение к первой цели.
+        """
+        names = list(results)
+        baseline = results[names[0]]
+        for name, result in results.items():
+            line = (
+                f'{name}: {result["requests"]} запросов, {result["rps"]} rps'
+            )
+            if baseline['rps']:
+                line += f', x{result["rps"] / baseline["rps"]:.2f}'
+            self.stdout.write(line)
+        labels = sorted({
+            label for result in results.values() for label in result['routes']
+        })
+        for label in labels:
+            self.stdout.write(label)
+            base = baseline['routes'].get(label)
+            for name, result in results.items():
+                route = result['routes'].get(label)
+                if route is None:
+                    self.stdout.write(f'    {name:12} нет запросов')
+                    continue
+                line = (
+                    f'    {name:12} {route["rps"]:>8} rps  '
+                    f'p95 {route["p95_ms"]:>8} мс  '
+                    f'p99 {route["p99_ms"]:>8} мс  {route["statuses"]}'
+                )
+                if base is not None and name != names[0]:
+                    line += (
+                        f'  Δp95 {route["p95_ms"] - base["p95_ms"]:+.2f} мс'
+                    )
+                self.stdout.write(line)
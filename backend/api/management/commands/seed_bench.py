@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.seeding import seed_data
+
+
+class Command(BaseCommand):
+    help = 'Generate benchmark data with realistic distributions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=30)
+        parser.add_argument('--carts', type=int, default=5)
+        parser.add_argument('--subscriptions', type=int, default=10)
+        parser.add_argument('--author-skew', type=float, default=1.2)
+        parser.add_argument('--tag-skew', type=float, default=1.0)
+        parser.add_argument('--popularity-skew', type=float, default=1.0)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            users, recipes = seed_data(
+                users=options['users'],
+                recipes=options['recipes'],
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                ingredients_per_recipe=options['ingredients_per_recipe'],
+                favorites_per_user=options['favorites'],
+                carts_per_user=options['carts'],
+                subscriptions_per_user=options['subscriptions'],
+                seed=options['seed'],
+                prefix=options['prefix'],
+                author_skew=options['author_skew'],
+                tag_skew=options['tag_skew'],
+                popularity_skew=options['popularity_skew'],
+                fill_feed=True
+            )
+        self.stdout.write(
+            f'Создано пользователей: {len(users)}, рецептов: {len(recipes)} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,153 @@
+import hashlib
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+
+from api.relations import get_user_relations
+from api.representations import (RECIPE_FIELDS, RECIPE_OUTPUT_FIELDS,
+                                 represent_recipes)
+from recipes.models import Recipe
+
+# Флаги, которые зависят от пользователя и не попадают в общий кеш
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+SHARED_FIELDS = tuple(
+    field for field in RECIPE_OUTPUT_FIELDS if field not in USER_FLAGS
+)
+CATALOG_VERSION_KEY = 'recipe-version:catalog'
+
+# Тело рецепта без флагов, время изменения и версия для ETag
+CachedRecipe = namedtuple('CachedRecipe', ('body', 'updated_at', 'version'))
+
+
+def get_recipe_version_key(recipe_id):
+    return f'recipe-version:recipe:{recipe_id}'
+
+
+def get_author_version_key(author_id):
+    return f'recipe-version:author:{author_id}'
+
+
+def bump_versions(*keys):
+    """ Новые версии ключей после коммита: старые записи кеша не читаются """
+    transaction.on_commit(
+        lambda: cache.set_many(
+            {key: time.time_ns() for key in keys}, timeout=None
+        )
+    )
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_body_key(recipe_id, request):
+    recipe_version, catalog_version = get_versions([
+        get_recipe_version_key(recipe_id), CATALOG_VERSION_KEY
+    ])
+    # Ссылка на картинку абсолютная и зависит от хоста запроса
+    host = hashlib.sha256(
+        request.build_absolute_uri('/').encode()
+    ).hexdigest()[:12]
+    return (
+        f'recipe-body:{recipe_id}:{recipe_version}:{catalog_version}:{host}'
+    )
+
+
+def get_cached_recipe(recipe_id, request):
+    """
+    Общая для всех пользователей часть представления рецепта из кеша или
+    собранная заново; None, если рецепта нет или его автор удаляется.
+    Вместе с телом хранится версия автора, чтобы смена его данных тоже
+    сбрасывала запись. Версии в локальном кеше процесса меняет только
+    сам процесс, поэтому запись сверяется с updated_at рецепта в БД.
+    """
+    recipes = Recipe.objects.visible().filter(id=recipe_id)
+    key = get_body_key(recipe_id, request)
+    cached = cache.get(key)
+    if cached is not None:
+        author_version, updated_at, body = cached
+        if author_version == get_versions(
+            [get_author_version_key(body['author']['id'])]
+        )[0] and updated_at == recipes.values_list(
+            'updated_at', flat=True
+        ).first():
+            return CachedRecipe(body, updated_at, f'{key}:{author_version}')
+    rows = list(recipes.values(*RECIPE_FIELDS, 'updated_at'))
+    if not rows:
+        return None
+    author_version = get_versions(
+        [get_author_version_key(rows[0]['author_id'])]
+    )[0]
+    body = represent_recipes(rows, request, SHARED_FIELDS)[0]
+    del body['author']['is_subscribed']
+    updated_at = rows[0]['updated_at']
+    cache.set(
+        key, (author_version, updated_at, body),
+        settings.RECIPE_CACHE_TIMEOUT
+    )
+    return CachedRecipe(body, updated_at, f'{key}:{author_version}')
+
+
+def get_user_flags(recipe, request, fields=RECIPE_OUTPUT_FIELDS):
+    """ Флаги текущего пользователя для полей из fields """
+    relations = get_user_relations(request)
+    flags = {}
+    if 'is_favorited' in fields:
+        flags['is_favorited'] = relations.is_favorited(recipe.body['id'])
+    if 'is_in_shopping_cart' in fields:
+        flags['is_in_shopping_cart'] = relations.is_in_shopping_cart(
+            recipe.body['id']
+        )
+    if 'author' in fields:
+        flags['is_subscribed'] = relations.is_subscribed(
+            recipe.body['author']['id']
+        )
+    return flags
+
+
+def represent_cached_recipe(recipe, flags, fields=RECIPE_OUTPUT_FIELDS):
+    """
+    Представление рецепта как у RecipeListRetrieveSerializer: общая часть
+    из кеша и флаги текущего пользователя поверх нее.
+    """
+    values = {**recipe.body, **flags}
+    if 'author' in fields:
+        values['author'] = {
+            **recipe.body['author'], 'is_subscribed': flags['is_subscribed']
+        }
+    return {field: values[field] for field in fields}
+
+
+def get_recipe_etag_prefix(recipe_id, updated_at):
+    """ Часть ETag, которая меняется только вместе с самим рецептом """
+    return f'r{recipe_id}.{int(updated_at.timestamp() * 1000000)}'
+
+
+def get_recipe_etag(recipe, flags, fields):
+    digest = hashlib.sha256(
+        repr((recipe.version, sorted(flags.items()), fields)).encode()
+    ).hexdigest()[:16]
+    prefix = get_recipe_etag_prefix(recipe.body['id'], recipe.updated_at)
+    return f'"{prefix}.{digest}"'
+
+
+def if_match_passes(header, recipe_id, updated_at):
+    """
+    Проверка If-Match по части ETag самого рецепта: флаги пользователя,
+    набор полей и данные автора на конфликт изменений не влияют.
+    """
+    prefix = get_recipe_etag_prefix(recipe_id, updated_at)
+    for etag in parse_etags(header):
+        etag = (etag[2:] if etag.startswith('W/') else etag).strip('"')
+        if etag == '*' or etag == prefix or etag.startswith(f'{prefix}.'):
+            return True
+    return False
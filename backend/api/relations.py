@@ -0,0 +1,75 @@
+from rest_framework import serializers
+
+from recipes.models import Favorite, ShoppingCart, Subscription
+
+# Связь: модель, поле текущего пользователя, поле ID объекта
+RELATIONS = {
+    'favorites': (Favorite, 'user', 'recipe_id'),
+    'cart': (ShoppingCart, 'user', 'recipe_id'),
+    'subscriptions': (Subscription, 'follower', 'author_id'),
+}
+
+
+class UserRelations:
+    """
+    Избранное, корзина и подписки текущего пользователя в виде множеств
+    ID. Загружаются один раз на запрос и только для ID, которые встретились
+    в ответе, после чего флаги в сериализаторах проверяются без запросов.
+    """
+
+    def __init__(self, user):
+        self.user = user if user and user.is_authenticated else None
+        self.loaded = {name: set() for name in RELATIONS}
+        self.found = {name: set() for name in RELATIONS}
+
+    def load(self, name, ids):
+        missing = set(ids) - self.loaded[name]
+        if not missing:
+            return
+        self.loaded[name] |= missing
+        if self.user is None:
+            return
+        model, user_field, id_field = RELATIONS[name]
+        self.found[name].update(model.objects.filter(
+            **{user_field: self.user, f'{id_field}__in': missing}
+        ).values_list(id_field, flat=True))
+
+    def contains(self, name, object_id):
+        self.load(name, (object_id,))
+        return object_id in self.found[name]
+
+    def is_favorited(self, recipe_id):
+        return self.contains('favorites', recipe_id)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return self.contains('cart', recipe_id)
+
+    def is_subscribed(self, author_id):
+        return self.contains('subscriptions', author_id)
+
+
+def get_user_relations(request):
+    """ UserRelations текущего запроса, общий для всех сериализаторов """
+    user = getattr(request, 'user', None)
+    relations = getattr(request, '_user_relations', None)
+    if relations is None or relations.user != (
+        user if user and user.is_authenticated else None
+    ):
+        relations = UserRelations(user)
+        if request is not None:
+            request._user_relations = relations
+    return relations
+
+
+class UserRelationsListSerializer(serializers.ListSerializer):
+    """
+    Перед сериализацией списка загружает связи текущего пользователя
+    сразу для всех объектов страницы через load_relations() элемента.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.child.load_relations(
+            get_user_relations(self.context.get('request')), items
+        )
+        return super().to_representation(items)
@@ -0,0 +1,125 @@
+from collections import defaultdict
+
+from api.relations import get_user_relations
+from recipes.models import IngredientsRecipes, Recipe, TagsRecipes, User
+
+RECIPE_OUTPUT_FIELDS = (
+    'id', 'tags', 'author', 'ingredients',
+    'is_favorited', 'is_in_shopping_cart',
+    'name', 'image', 'text', 'cooking_time',
+)
+# Колонки таблицы рецептов, из которых собираются поля ответа
+RECIPE_FIELD_COLUMNS = {
+    'name': 'name',
+    'image': 'image',
+    'text': 'text',
+    'cooking_time': 'cooking_time',
+    'author': 'author_id',
+}
+RECIPE_FIELDS = ('id', 'name', 'image', 'text', 'cooking_time', 'author_id')
+USER_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+
+
+def get_requested_fields(request, available):
+    """ Поля из параметра fields в порядке available, по умолчанию все """
+    requested = request.GET.get('fields') if request else None
+    if not requested:
+        return tuple(available)
+    requested = set(requested.split(','))
+    return tuple(
+        field for field in available if field in requested
+    ) or tuple(available)
+
+
+def get_recipe_columns(fields):
+    return ('id',) + tuple(
+        RECIPE_FIELD_COLUMNS[field]
+        for field in fields if field in RECIPE_FIELD_COLUMNS
+    )
+
+
+def get_image_url(name, request):
+    """ Ссылка на файл так же, как ее строит ImageField сериализатора """
+    if not name:
+        return None
+    url = Recipe.image.field.storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def get_authors(author_ids, relations):
+    relations.load('subscriptions', author_ids)
+    return {
+        author['id']: {
+            **author, 'is_subscribed': relations.is_subscribed(author['id'])
+        }
+        for author in User.objects.filter(
+            id__in=author_ids).values(*USER_FIELDS)
+    }
+
+
+def get_tags(recipe_ids):
+    tags = defaultdict(list)
+    for row in TagsRecipes.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag__name').values_list(
+        'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug'
+    ):
+        tags[row[0]].append({
+            'id': row[1], 'name': row[2], 'color': row[3], 'slug': row[4],
+        })
+    return tags
+
+
+def get_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    for row in IngredientsRecipes.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('id').values_list(
+        'recipe_id', 'ingredient__id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    ):
+        ingredients[row[0]].append({
+            'id': row[1], 'name': row[2],
+            'measurement_unit': row[3], 'amount': row[4],
+        })
+    return ingredients
+
+
+def represent_recipes(rows, request, fields=RECIPE_OUTPUT_FIELDS):
+    """
+    Представление рецептов для чтения из строк values() той же формы,
+    что у RecipeListRetrieveSerializer, за постоянное число запросов и
+    без создания моделей. Связанные данные запрашиваются только для
+    полей из fields.
+    """
+    relations = get_user_relations(request)
+    recipe_ids = [row['id'] for row in rows]
+    authors = get_authors(
+        {row['author_id'] for row in rows}, relations
+    ) if 'author' in fields else {}
+    tags = get_tags(recipe_ids) if 'tags' in fields else {}
+    ingredients = get_ingredients(
+        recipe_ids) if 'ingredients' in fields else {}
+    if 'is_favorited' in fields:
+        relations.load('favorites', recipe_ids)
+    if 'is_in_shopping_cart' in fields:
+        relations.load('cart', recipe_ids)
+    getters = {
+        'id': lambda row: row['id'],
+        'tags': lambda row: tags[row['id']],
+        'author': lambda row: authors[row['author_id']],
+        'ingredients': lambda row: ingredients[row['id']],
+        'is_favorited': lambda row: relations.is_favorited(row['id']),
+        'is_in_shopping_cart': (
+            lambda row: relations.is_in_shopping_cart(row['id'])
+        ),
+        'name': lambda row: row['name'],
+        'image': lambda row: get_image_url(row['image'], request),
+        'text': lambda row: row['text'],
+        'cooking_time': lambda row: row['cooking_time'],
+    }
+    selected = [(field, getters[field]) for field in fields]
+    return [
+        {field: getter(row) for field, getter in selected}
+        for row in rows
+    ]
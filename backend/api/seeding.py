@@ -0,0 +1,187 @@
+import hashlib
+import random
+
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Favorite, FeedItem, Ingredient, IngredientsRecipes,
+                            Recipe, ShoppingCart, Subscription, Tag,
+                            TagsRecipes, User)
+
+SEED_PREFIX = 'seed'
+SEED_IMAGE = 'recipes/images/seed.png'
+BATCH_SIZE = 1000
+# Картинка 1x1 для тел запросов, которые создают рецепты
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA'
+    'CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAA'
+    'AAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+class Rollback(Exception):
+    """ Откатывает транзакцию с данными замера """
+
+
+def skewed_weights(count, skew):
+    """ Веса по степенному закону: skew=0 - равномерно, 1 - закон Ципфа """
+    return [1 / (rank + 1) ** skew for rank in range(count)]
+
+
+def sample(rng, population, count, weights=None):
+    """ Выборка без повторов, с весами - по методу Эфраимидиса-Спиракиса """
+    count = min(count, len(population))
+    if weights is None:
+        return rng.sample(population, count)
+    keyed = sorted(
+        zip(population, weights),
+        key=lambda item: rng.random() ** (1 / item[1]),
+        reverse=True
+    )
+    return [item for item, _ in keyed[:count]]
+
+
+def seed_data(users=30, recipes=200, tags=6, ingredients=300,
+              ingredients_per_recipe=8, favorites_per_user=20,
+              carts_per_user=5, subscriptions_per_user=5, seed=0,
+              prefix=SEED_PREFIX, author_skew=0, tag_skew=0,
+              popularity_skew=0, fill_feed=False):
+    """
+    Быстро создаем пользователей, рецепты и связи через bulk_create.
+    Перекосы задают долю популярных авторов, тэгов и рецептов.
+    Сигналы не вызываются, ленту подписчиков заполняем по fill_feed.
+    """
+    rng = random.Random(seed)
+    user_objs = User.objects.bulk_create(
+        [
+            User(
+                email=f'{prefix}{number}@example.org',
+                username=f'{prefix}{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='!'
+            )
+            for number in range(users)
+        ],
+        batch_size=BATCH_SIZE
+    )
+    Token.objects.bulk_create(
+        [Token(key=Token.generate_key(), user=user) for user in user_objs],
+        batch_size=BATCH_SIZE
+    )
+    tag_objs = Tag.objects.bulk_create([
+        Tag(
+            name=f'{prefix}-tag-{number}',
+            color='#' + hashlib.md5(
+                f'{prefix}-tag-{number}'.encode()
+            ).hexdigest()[:6].upper(),
+            slug=f'{prefix}-tag-{number}'
+        )
+        for number in range(tags)
+    ])
+    ingredient_objs = Ingredient.objects.bulk_create(
+        [
+            Ingredient(
+                name=f'{prefix}-ingredient-{number}',
+                measurement_unit='г'
+            )
+            for number in range(ingredients)
+        ],
+        batch_size=BATCH_SIZE
+    )
+    author_weights = skewed_weights(users, author_skew)
+    recipe_objs = Recipe.objects.bulk_create(
+        [
+            Recipe(
+                author=author,
+                name=f'{prefix}-recipe-{number}',
+                image=SEED_IMAGE,
+                text='Текст рецепта ' * rng.randint(5, 50),
+                cooking_time=rng.randint(1, 180)
+            )
+            for number, author in enumerate(
+                rng.choices(user_objs, author_weights, k=recipes)
+            )
+        ],
+        batch_size=BATCH_SIZE
+    )
+    tag_weights = skewed_weights(tags, tag_skew)
+    TagsRecipes.objects.bulk_create(
+        [
+            TagsRecipes(recipe=recipe, tag=tag)
+            for recipe in recipe_objs
+            for tag in sample(
+                rng, tag_objs, rng.randint(1, 3), tag_weights
+            )
+        ],
+        batch_size=BATCH_SIZE
+    )
+    IngredientsRecipes.objects.bulk_create(
+        [
+            IngredientsRecipes(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=rng.randint(1, 500)
+            )
+            for recipe in recipe_objs
+            for ingredient in sample(
+                rng, ingredient_objs, ingredients_per_recipe
+            )
+        ],
+        batch_size=BATCH_SIZE
+    )
+    recipe_weights = skewed_weights(recipes, popularity_skew)
+    Favorite.objects.bulk_create(
+        [
+            Favorite(user=user, recipe=recipe)
+            for user in user_objs
+            for recipe in sample(
+                rng, recipe_objs, favorites_per_user, recipe_weights
+            )
+        ],
+        batch_size=BATCH_SIZE
+    )
+    ShoppingCart.objects.bulk_create(
+        [
+            ShoppingCart(user=user, recipe=recipe)
+            for user in user_objs
+            for recipe in sample(
+                rng, recipe_objs, carts_per_user, recipe_weights
+            )
+        ],
+        batch_size=BATCH_SIZE
+    )
+    subscriptions = Subscription.objects.bulk_create(
+        [
+            Subscription(
+                follower=user, author=author, feed_filled=fill_feed
+            )
+            for user in user_objs
+            for author in [
+                author for author in sample(
+                    rng, user_objs, subscriptions_per_user + 1,
+                    author_weights
+                )
+                if author != user
+            ][:subscriptions_per_user]
+        ],
+        batch_size=BATCH_SIZE
+    )
+    if fill_feed:
+        recipes_by_author = {}
+        for recipe in recipe_objs:
+            recipes_by_author.setdefault(recipe.author_id, []).append(recipe)
+        FeedItem.objects.bulk_create(
+            (
+                FeedItem(
+                    follower_id=subscription.follower_id,
+                    recipe_id=recipe.id,
+                    pub_date=recipe.pub_date
+                )
+                for subscription in subscriptions
+                for recipe in recipes_by_author.get(
+                    subscription.author_id, ()
+                )
+            ),
+            batch_size=BATCH_SIZE
+        )
+    return user_objs, recipe_objs
@@ -1,11 +1,49 @@
+from django.db.models import Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
 from rest_framework import serializers
 
+from api.fields import (PreloadedListSerializer, PreloadedManyRelatedField,
+                        PreloadedPrimaryKeyRelatedField)
+from api.relations import UserRelationsListSerializer, get_user_relations
+from api.representations import get_requested_fields
 from recipes.models import (Favorite, Ingredient, IngredientsRecipes, Recipe,
                             ShoppingCart, Subscription, Tag, User)
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+def get_ingredients_prefetch():
+    """ Ингредиенты рецепта с названиями одним запросом на страницу """
+    return Prefetch(
+        'ingredient_recipes',
+        queryset=IngredientsRecipes.objects.select_related(
+            'ingredient'
+        ).order_by('id')
+    )
+
+
+def get_recipes_limit(request):
+    """ Число рецептов автора из параметра recipes_limit или None """
+    try:
+        limit = int(request.GET['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
+class SparseFieldsMixin:
+    """ Оставляет в ответе только поля из параметра fields запроса """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+        requested = get_requested_fields(self.context.get('request'), fields)
+        return {name: fields[name] for name in requested}
+
+
+class CustomUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Сериализатор для отображения Пользователя"""
     is_subscribed = serializers.SerializerMethodField()
 
@@ -16,15 +54,21 @@ class CustomUserSerializer(serializers.ModelSerializer):
             'first_name', 'last_name',
             'is_subscribed'
         )
+        list_serializer_class = UserRelationsListSerializer
+
+    def load_relations(self, relations, users):
+        if 'is_subscribed' in self.fields:
+            relations.load('subscriptions', [
+                user.id for user in users
+                if not hasattr(user, 'is_subscribed')
+            ])
 
     def get_is_subscribed(self, obj):
-        return bool(
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_user_relations(
             self.context.get('request')
-            and self.context['request'].user.is_authenticated
-            and Subscription.objects.filter(
-                author=obj,
-                follower=self.context['request'].user).exists()
-        )
+        ).is_subscribed(obj.id)
 
 
 class TagListSerializer(serializers.ModelSerializer):
@@ -57,7 +101,7 @@ class IngredientsRecipesListSerializer(serializers.ModelSerializer):
 
 class IngredientsRecipesCreateSerializer(serializers.ModelSerializer):
     """ Сериализатор для Ингредиент-Рецепт """
-    id = serializers.PrimaryKeyRelatedField(
+    id = PreloadedPrimaryKeyRelatedField(
         source='ingredient.id',
         queryset=Ingredient.objects.all()
     )
@@ -65,9 +109,11 @@ class IngredientsRecipesCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = IngredientsRecipes
         fields = ('id', 'amount')
+        list_serializer_class = PreloadedListSerializer
 
 
-class RecipeListRetrieveSerializer(serializers.ModelSerializer):
+class RecipeListRetrieveSerializer(SparseFieldsMixin,
+                                   serializers.ModelSerializer):
     """ Сериализатор для получения Рецептов """
     ingredients = IngredientsRecipesListSerializer(
         many=True, source='ingredient_recipes',
@@ -89,24 +135,28 @@ class RecipeListRetrieveSerializer(serializers.ModelSerializer):
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time',
                   )
+        list_serializer_class = UserRelationsListSerializer
+
+    def load_relations(self, relations, recipes):
+        recipe_ids = [recipe.id for recipe in recipes]
+        if 'is_favorited' in self.fields:
+            relations.load('favorites', recipe_ids)
+        if 'is_in_shopping_cart' in self.fields:
+            relations.load('cart', recipe_ids)
+        if 'author' in self.fields:
+            relations.load(
+                'subscriptions', [recipe.author_id for recipe in recipes]
+            )
 
     def get_is_favorited(self, obj):
-        return bool(
+        return get_user_relations(
             self.context.get('request')
-            and self.context['request'].user.is_authenticated
-            and Favorite.objects.filter(
-                recipe=obj,
-                user=self.context['request'].user).exists()
-        )
+        ).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        return bool(
+        return get_user_relations(
             self.context.get('request')
-            and self.context['request'].user.is_authenticated
-            and ShoppingCart.objects.filter(
-                recipe=obj,
-                user=self.context['request'].user).exists()
-        )
+        ).is_in_shopping_cart(obj.id)
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
@@ -114,9 +164,10 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     ingredients = IngredientsRecipesCreateSerializer(
         many=True
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
+    tags = PreloadedManyRelatedField(
+        child_relation=PreloadedPrimaryKeyRelatedField(
+            queryset=Tag.objects.all()
+        )
     )
 
     image = Base64ImageField(
@@ -132,6 +183,9 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                   )
 
     def to_representation(self, value):
+        prefetch_related_objects(
+            [value], 'tags', get_ingredients_prefetch()
+        )
         return RecipeListRetrieveSerializer(value).data
 
     def validate_image(self, value):
@@ -236,24 +290,19 @@ class SubscriptionListSerializer(CustomUserSerializer):
             'recipes_count',
         )
 
-    def get_is_subscribed(self, obj):
-        if Subscription.objects.filter(author=obj).first():
-            return True
-        return False
-
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.author_recipes.count()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        recipes = obj.author_recipes.all()
-        if recipes_limit is not None:
-            try:
-                int_recipes_limit = int(recipes_limit)
-                recipes = obj.author_recipes.all()[:int(int_recipes_limit)]
-            except ValueError:
-                pass
+        if hasattr(obj, 'subscription_recipes'):
+            recipes = obj.subscription_recipes
+        else:
+            recipes = obj.author_recipes.all()
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes = recipes[:limit]
         return SubscriptionRecipeSerializer(
             recipes,
             many=True).data
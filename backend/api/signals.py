@@ -0,0 +1,120 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import get_token_cache_key
+from api.events import (publish_cart_changed, publish_new_recipe,
+                        publish_subscription_changed)
+from api.facets import FACETS_VERSION_KEY
+from api.recipe_cache import (CATALOG_VERSION_KEY, bump_versions,
+                              get_author_version_key, get_recipe_version_key)
+from recipes.deletion import recipes_deleted, subscriptions_deleted
+from recipes.models import (Ingredient, IngredientsRecipes, Recipe,
+                            ShoppingCart, Subscription, Tag, TagsRecipes, User)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    cache.delete(get_token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    if update_fields is None or 'is_active' in update_fields:
+        # Рецепты неактивного автора пропадают из списка и фасетов
+        bump_versions(get_author_version_key(instance.id), FACETS_VERSION_KEY)
+    else:
+        bump_versions(get_author_version_key(instance.id))
+    cache.delete_many([
+        get_token_cache_key(key) for key in Token.objects.filter(
+            user_id=instance.id
+        ).values_list('key', flat=True)
+    ])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_versions(get_recipe_version_key(instance.id), FACETS_VERSION_KEY)
+
+
+@receiver(recipes_deleted)
+def recipes_bulk_deleted(sender, recipe_ids, author_ids, **kwargs):
+    bump_versions(*map(get_recipe_version_key, recipe_ids), FACETS_VERSION_KEY)
+
+
+# Удаление связей всегда сопровождается сохранением или удалением самого
+# рецепта, а обработчик post_delete отключил бы быстрое удаление связей
+@receiver(post_save, sender=IngredientsRecipes)
+@receiver(post_save, sender=TagsRecipes)
+def recipe_relation_changed(sender, instance, **kwargs):
+    bump_versions(get_recipe_version_key(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    bump_versions(FACETS_VERSION_KEY)
+    if not reverse:
+        bump_versions(get_recipe_version_key(instance.id))
+    elif pk_set:
+        bump_versions(*map(get_recipe_version_key, pk_set))
+    else:
+        bump_versions(CATALOG_VERSION_KEY)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, instance, **kwargs):
+    bump_versions(CATALOG_VERSION_KEY, FACETS_VERSION_KEY)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_new_recipe(instance))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_item_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_cart_changed(
+            instance.user_id, instance.recipe_id, 'added'
+        ))
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_item_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: publish_cart_changed(
+        instance.user_id, instance.recipe_id, 'removed'
+    ))
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_subscription_changed(
+            instance.follower_id, instance.author_id, 'added'
+        ))
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: publish_subscription_changed(
+        instance.follower_id, instance.author_id, 'removed'
+    ))
+
+
+@receiver(subscriptions_deleted)
+def subscriptions_bulk_deleted(sender, author_id, follower_ids, **kwargs):
+    def publish():
+        for follower_id in follower_ids:
+            publish_subscription_changed(follower_id, author_id, 'removed')
+    transaction.on_commit(publish)
@@ -0,0 +1,514 @@
+import datetime
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from api.benchmarks import get_recipe_queryset, make_request
+from api.changes import read_cursor
+from api.events import load_stream_state
+from api.recipe_cache import (get_cached_recipe, get_user_flags,
+                              represent_cached_recipe)
+from api.renderers import FastJSONRenderer
+from api.representations import RECIPE_FIELDS, represent_recipes
+from api.seeding import IMAGE, seed_data
+from api.serializers import RecipeListRetrieveSerializer
+from core.models import Job
+from core.tasks import Task, claim_job, registry, release_stale_jobs, run_job
+from core.worker import Worker
+from recipes.feed import backfill_feed
+from recipes.models import (ChangeLog, Favorite, FeedItem, Ingredient, Recipe,
+                            ShoppingCart, Subscription, Tag, User)
+
+
+class MediaTestCase(APITestCase):
+    """ Картинки рецептов пишутся во временный MEDIA_ROOT """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def recipe_payload(self, ingredients, tags, name='Проверка запросов'):
+        """ Тело рецепта с первыми ingredients ингредиентами и тэгами tags """
+        return {
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in Ingredient.objects.values_list(
+                    'id', flat=True
+                )[:ingredients]
+            ],
+            'tags': tags,
+            'image': IMAGE,
+            'name': name,
+            'text': 'Текст',
+            'cooking_time': 10,
+        }
+
+
+class QueryCountTests(MediaTestCase):
+    """
+    Число SQL-запросов маршрутов не растет с размером страницы
+    и числом ингредиентов рецепта: N+1 роняет тест.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users, _ = seed_data(users=12, recipes=60, subscriptions_per_user=5)
+        cls.user = users[0]
+        for author_id in cls.user.author_followers.values_list(
+            'author_id', flat=True
+        ):
+            backfill_feed(cls.user.id, author_id)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(
+            user=self.user, token=self.user.auth_token
+        )
+
+    def count_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, 'json')
+        self.assertLess(response.status_code, 400, response.content)
+        return len(queries)
+
+    def assertConstantQueries(self, budget, method, small, large):
+        """
+        Запрос small укладывается в budget, а large с большим числом
+        объектов делает ровно столько же запросов.
+        """
+        small_url, small_data = small
+        large_url, large_data = large
+        queries = self.count_queries(method, small_url, small_data)
+        self.assertLessEqual(queries, budget)
+        cache.clear()
+        with self.assertNumQueries(queries):
+            response = getattr(self.client, method)(
+                large_url, large_data, 'json'
+            )
+        self.assertLess(response.status_code, 400, response.content)
+
+    def test_recipes_list(self):
+        self.assertConstantQueries(
+            8, 'get',
+            ('/api/recipes/?limit=1', None),
+            ('/api/recipes/?limit=30', None)
+        )
+
+    def test_recipes_list_anonymous(self):
+        self.client.force_authenticate(user=None)
+        self.assertConstantQueries(
+            5, 'get',
+            ('/api/recipes/?limit=1', None),
+            ('/api/recipes/?limit=30', None)
+        )
+
+    def test_recipes_list_ids(self):
+        ids = list(Recipe.objects.values_list('id', flat=True)[:30])
+        self.assertConstantQueries(
+            7, 'get',
+            (f'/api/recipes/?ids={ids[0]}', None),
+            (f'/api/recipes/?ids={",".join(map(str, ids))}', None)
+        )
+
+    def test_recipes_list_ids_out_of_range(self):
+        response = self.client.get('/api/recipes/?ids=99999999999999999999')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn('ids', response.json())
+        for method, url in (
+            ('get', '/api/recipes/99999999999999999999/'),
+            ('post', '/api/recipes/99999999999999999999/favorite/'),
+            ('post', '/api/users/99999999999999999999/subscribe/'),
+        ):
+            response = getattr(self.client, method)(url)
+            self.assertEqual(response.status_code, 404, url)
+
+    def test_recipes_feed(self):
+        self.assertConstantQueries(
+            9, 'get',
+            ('/api/recipes/feed/?limit=1', None),
+            ('/api/recipes/feed/?limit=30', None)
+        )
+
+    def test_recipe_create(self):
+        tags = list(Tag.objects.values_list('id', flat=True))
+        self.assertConstantQueries(
+            13, 'post',
+            ('/api/recipes/', self.recipe_payload(1, tags[:1])),
+            ('/api/recipes/', self.recipe_payload(30, tags))
+        )
+
+    def test_recipe_update(self):
+        # Оба изменения и удаляют, и добавляют тэги рецепта
+        tags = list(Tag.objects.values_list('id', flat=True))
+        recipe = Recipe.objects.filter(author=self.user).first()
+        recipe.tags.set(tags[-1:])
+        url = f'/api/recipes/{recipe.id}/'
+        self.assertConstantQueries(
+            18, 'patch',
+            (url, self.recipe_payload(1, tags[:1])),
+            (url, self.recipe_payload(30, tags[1:-1]))
+        )
+
+    def test_users_list(self):
+        self.assertConstantQueries(
+            1, 'get',
+            ('/api/users/?limit=1', None),
+            ('/api/users/?limit=12', None)
+        )
+
+    def test_subscriptions(self):
+        url = '/api/users/subscriptions/?recipes_limit=3&limit='
+        self.assertConstantQueries(
+            4, 'get',
+            (url + '1', None),
+            (url + '5', None)
+        )
+
+
+class RecipeCacheTests(MediaTestCase):
+    """ Кеши рецептов не отдают устаревшие данные после изменения """
+
+    @classmethod
+    def setUpTestData(cls):
+        users, _ = seed_data(users=2, recipes=4, subscriptions_per_user=1)
+        cls.user = users[0]
+        cls.recipe = Recipe.objects.filter(author=cls.user).first()
+        cls.url = f'/api/recipes/{cls.recipe.id}/'
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(
+            user=self.user, token=self.user.auth_token
+        )
+
+    def test_patch_invalidates_cache(self):
+        before = self.client.get(self.url)
+        response = self.client.patch(self.url, self.recipe_payload(
+            1, [self.recipe.tags.first().id], 'Новое название'
+        ), 'json')
+        self.assertEqual(response.status_code, 200, response.content)
+        after = self.client.get(self.url)
+        self.assertEqual(after.data['name'], 'Новое название')
+        self.assertNotEqual(after['ETag'], before['ETag'])
+
+    def test_change_missed_by_process_cache(self):
+        # Изменение в другом процессе не меняет версии локального кеша
+        self.client.get(self.url)
+        Recipe.objects.filter(id=self.recipe.id).update(
+            name='Изменен в другом процессе', updated_at=timezone.now()
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['name'], 'Изменен в другом процессе')
+
+    def test_fresh_etag_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_stale_if_match_rejected(self):
+        etag = self.client.get(self.url)['ETag']
+        payload = self.recipe_payload(1, [self.recipe.tags.first().id])
+        response = self.client.patch(
+            self.url, payload, 'json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        # Второе изменение по тому же ETag перезаписало бы первое
+        response = self.client.patch(
+            self.url, payload, 'json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 412)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_facets_without_shared_cache(self):
+        # Без общего кеша фасеты не переживают изменения в другом процессе
+        url = '/api/recipes/?facets=1'
+        before = self.client.get(url).data['facets']['cooking_time']
+        Recipe.objects.filter(id=self.recipe.id).update(cooking_time=100000)
+        after = self.client.get(url).data['facets']['cooking_time']
+        self.assertNotEqual(after, before)
+
+
+class ChangeSyncTests(APITestCase):
+    """ Синхронизация по журналу изменений """
+
+    @classmethod
+    def setUpTestData(cls):
+        users, _ = seed_data(
+            users=3, recipes=6, favorites_per_user=0, carts_per_user=0,
+            subscriptions_per_user=1
+        )
+        cls.user, cls.other = users[:2]
+        cls.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+
+    def setUp(self):
+        self.client.force_authenticate(
+            user=self.user, token=self.user.auth_token
+        )
+
+    def sync(self, cursor):
+        response = self.client.get('/api/recipes/changes/', {'since': cursor})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def favorite(self, user, recipe_id):
+        self.client.force_authenticate(user=user, token=user.auth_token)
+        response = self.client.post(f'/api/recipes/{recipe_id}/favorite/')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.client.force_authenticate(
+            user=self.user, token=self.user.auth_token
+        )
+
+    @override_settings(CHANGES_PAGE_SIZE=1)
+    def test_only_own_changes(self):
+        # Чужие записи не занимают место на странице
+        cursor = self.client.get('/api/recipes/changes/').data['next']
+        self.favorite(self.other, self.recipe_ids[0])
+        self.favorite(self.user, self.recipe_ids[1])
+        data = self.sync(cursor)
+        self.assertEqual(data['favorites']['added'], [self.recipe_ids[1]])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(read_cursor(data['next'])[1], [])
+
+    def test_late_commit_is_read_from_gap(self):
+        cursor = self.client.get('/api/recipes/changes/').data['next']
+        self.favorite(self.user, self.recipe_ids[0])
+        self.favorite(self.other, self.recipe_ids[1])
+        self.favorite(self.user, self.recipe_ids[2])
+        # Первая запись еще не видна: ее транзакция не закоммичена
+        late = ChangeLog.objects.filter(user=self.user).first()
+        ChangeLog.objects.filter(id=late.id).delete()
+        data = self.sync(cursor)
+        self.assertEqual(data['favorites']['added'], [self.recipe_ids[2]])
+        self.assertEqual(
+            [gap_id for gap_id, _ in read_cursor(data['next'])[1]], [late.id]
+        )
+        late.save(force_insert=True)
+        data = self.sync(data['next'])
+        self.assertEqual(data['favorites']['added'], [self.recipe_ids[0]])
+        self.assertEqual(read_cursor(data['next'])[1], [])
+
+    def test_inactive_author_recipes_hidden(self):
+        cursor = self.client.get('/api/recipes/changes/').data['next']
+        recipe = Recipe.objects.get(id=self.recipe_ids[0])
+        Recipe.objects.filter(id=recipe.id).update(name='Изменен')
+        ChangeLog.objects.create(
+            kind=ChangeLog.Kind.RECIPE, action=ChangeLog.Action.SAVED,
+            object_id=recipe.id
+        )
+        User.objects.filter(id=recipe.author_id).update(is_active=False)
+        data = self.sync(cursor)
+        self.assertEqual(data['recipes'], [])
+
+
+class UserDeletionTests(MediaTestCase):
+    """ Удаление пользователя: скрыт сразу, данные удаляет задача """
+
+    @classmethod
+    def setUpTestData(cls):
+        users, _ = seed_data(users=4, recipes=12, subscriptions_per_user=0)
+        cls.user, cls.author = users[:2]
+        cls.author.set_password('password-1')
+        cls.author.save(update_fields=('password',))
+        Subscription.objects.create(follower=cls.user, author=cls.author)
+        backfill_feed(cls.user.id, cls.author.id)
+        cls.recipe_ids = list(Recipe.objects.filter(
+            author=cls.author
+        ).values_list('id', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def delete_author(self):
+        self.client.force_authenticate(
+            user=self.author, token=self.author.auth_token
+        )
+        response = self.client.delete(
+            f'/api/users/{self.author.id}/',
+            {'current_password': 'password-1'}, 'json'
+        )
+        self.assertEqual(response.status_code, 204, response.content)
+        self.client.force_authenticate(
+            user=self.user, token=self.user.auth_token
+        )
+
+    def ids(self, url):
+        return {item['id'] for item in self.client.get(url).data['results']}
+
+    def test_author_hidden_at_once(self):
+        self.delete_author()
+        self.assertNotIn(self.author.id, self.ids('/api/users/?limit=10'))
+        self.assertEqual(
+            self.client.get(f'/api/users/{self.author.id}/').status_code, 404
+        )
+        self.assertNotIn(self.author.id, self.ids('/api/users/subscriptions/'))
+        self.assertFalse(
+            self.ids('/api/recipes/?limit=50') & set(self.recipe_ids)
+        )
+        self.assertFalse(
+            self.ids('/api/recipes/feed/?limit=50') & set(self.recipe_ids)
+        )
+        self.assertEqual(self.client.get(
+            f'/api/recipes/{self.recipe_ids[0]}/'
+        ).status_code, 404)
+
+    def test_job_deletes_rows(self):
+        self.delete_author()
+        job = claim_job()
+        while job is not None:
+            run_job(job)
+            job = claim_job()
+        self.assertFalse(User.objects.filter(id=self.author.id).exists())
+        self.assertFalse(
+            Recipe.objects.filter(id__in=self.recipe_ids).exists()
+        )
+        for model in (Favorite, ShoppingCart, FeedItem):
+            self.assertFalse(model.objects.filter(
+                recipe_id__in=self.recipe_ids
+            ).exists())
+        self.assertFalse(Subscription.objects.filter(
+            author_id=self.author.id
+        ).exists())
+        # Подписчик узнает об отписке из журнала изменений
+        self.assertTrue(ChangeLog.objects.filter(
+            kind=ChangeLog.Kind.SUBSCRIPTION,
+            action=ChangeLog.Action.DELETED,
+            object_id=self.author.id,
+            user=self.user
+        ).exists())
+
+
+class RepresentationTests(MediaTestCase):
+    """
+    Списки из values() и рецепт из кеша побайтно совпадают
+    с RecipeListRetrieveSerializer.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users, _ = seed_data(users=10, recipes=40)
+        cls.user = users[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_matches_serializer(self):
+        request = make_request(self.user)
+        recipes = get_recipe_queryset().order_by('id')
+        expected = JSONRenderer().render(RecipeListRetrieveSerializer(
+            recipes, many=True, context={'request': request}
+        ).data)
+        self.assertEqual(FastJSONRenderer().render(represent_recipes(
+            Recipe.objects.order_by('id').values(*RECIPE_FIELDS), request
+        )), expected)
+        cached = []
+        for recipe in recipes:
+            cached_recipe = get_cached_recipe(recipe.id, request)
+            cached.append(represent_cached_recipe(
+                cached_recipe, get_user_flags(cached_recipe, request)
+            ))
+        self.assertEqual(FastJSONRenderer().render(cached), expected)
+
+
+class JobQueueTests(TestCase):
+    """ Задача не теряется при ошибке в ней или в воркере """
+
+    def fail(self):
+        raise ValueError('Ошибка задачи')
+
+    def test_failed_job_retried_then_failed(self):
+        job = Job.objects.create(name='tests.fail', max_attempts=2)
+        with mock.patch.dict(
+            registry, {'tests.fail': Task(self.fail, 'tests.fail', 2)}
+        ), self.assertLogs('core.tasks', 'ERROR'):
+            run_job(claim_job())
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.Status.PENDING)
+            self.assertGreater(job.run_at, timezone.now())
+            self.assertIn('Ошибка задачи', job.last_error)
+            Job.objects.filter(id=job.id).update(run_at=timezone.now())
+            run_job(claim_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_job_of_dead_worker_released(self):
+        job = Job.objects.create(
+            name='tests.fail',
+            status=Job.Status.RUNNING,
+            attempts=1,
+            locked_at=timezone.now() - datetime.timedelta(
+                seconds=settings.JOBS_LOCK_TIMEOUT + 1
+            )
+        )
+        self.assertEqual(release_stale_jobs(), 1)
+        self.assertEqual(claim_job().id, job.id)
+
+    @override_settings(JOBS_MAX_BACKOFF=0)
+    def test_worker_loop_survives_errors(self):
+        worker = Worker(poll_interval=0.001)
+        calls = []
+
+        def claim():
+            calls.append(None)
+            if len(calls) == 1:
+                raise DatabaseError('Соединение потеряно')
+            worker.stop()
+
+        with mock.patch('core.worker.claim_job', claim), mock.patch(
+            'core.worker.connections'
+        ), mock.patch('core.worker.close_old_connections'), self.assertLogs(
+            'core.worker', 'ERROR'
+        ):
+            worker.loop()
+        self.assertEqual(len(calls), 2)
+
+
+class EventTicketTests(APITestCase):
+    """ Поток событий открывается по короткоживущему билету """
+
+    @classmethod
+    def setUpTestData(cls):
+        users, _ = seed_data(users=2, recipes=2, subscriptions_per_user=1)
+        cls.user = users[0]
+
+    def get_ticket(self):
+        self.client.force_authenticate(
+            user=self.user, token=self.user.auth_token
+        )
+        response = self.client.post('/api/users/events_ticket/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data['ticket']
+
+    def test_ticket_opens_stream(self):
+        user_id, _ = load_stream_state(ticket=self.get_ticket())
+        self.assertEqual(user_id, self.user.id)
+
+    def test_expired_ticket_rejected(self):
+        ticket = self.get_ticket()
+        with override_settings(EVENTS_TICKET_SECONDS=-1):
+            with self.assertRaises(AuthenticationFailed):
+                load_stream_state(ticket=ticket)
+
+    def test_anonymous_gets_no_ticket(self):
+        response = self.client.post('/api/users/events_ticket/')
+        self.assertEqual(response.status_code, 401)
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
+from api import async_views
 from api.views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
                        TagViewSet)
 
@@ -19,7 +21,33 @@ router_v1.register(
 router_v1.register(
     prefix='recipes', viewset=RecipeViewSet, basename='recipes')
 
+router_urls = router_v1.urls
+
+if settings.ASYNC_READ_VIEWS:
+    router_urls = [
+        path('tags/', async_views.tag_list, name='tags-list'),
+        path('tags/<int:pk>/', async_views.tag_detail, name='tags-detail'),
+        path(
+            'ingredients/',
+            async_views.ingredient_list,
+            name='ingredients-list'
+        ),
+        path(
+            'ingredients/<int:pk>/',
+            async_views.ingredient_detail,
+            name='ingredients-detail'
+        ),
+    ] + async_views.offload_urlpatterns(
+        router_urls,
+        (
+            'recipes-list',
+            'recipes-detail',
+            'recipes-feed',
+            'users-current-user-subscriptions',
+        )
+    )
+
 urlpatterns = [
-    path('', include(router_v1.urls)),
+    path('', include(router_urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,28 +1,69 @@
 import csv
+import datetime
+import io
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q, Sum
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
 from django_filters import rest_framework as filters
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from api.changes import get_changes
+from api.events import make_ticket
+from api.facets import get_facets
 from api.filters import IngredientFilter, RecipeFilter
 from api.permissions import IsAuthorOrReadOnly
+from api.recipe_cache import (get_cached_recipe, get_recipe_etag,
+                              get_user_flags, if_match_passes,
+                              represent_cached_recipe)
+from api.representations import (RECIPE_OUTPUT_FIELDS, get_recipe_columns,
+                                 get_requested_fields, represent_recipes)
 from api.serializers import (CustomUserSerializer, FavoriteSerializer,
                              IngredientSerializer,
                              RecipeCreateUpdateSerializer,
                              RecipeListRetrieveSerializer,
                              ShoppingCartSerializer,
                              SubscriptionCreateDeleteSerializer,
-                             SubscriptionListSerializer, TagListSerializer)
+                             SubscriptionListSerializer, TagListSerializer,
+                             get_ingredients_prefetch, get_recipes_limit)
+from recipes.deletion import delete_recipes
+from recipes.feed import get_feed_keys
 from recipes.models import (Favorite, Ingredient, IngredientsRecipes, Recipe,
                             ShoppingCart, Subscription, Tag, User)
+from recipes.tasks import delete_user_task
+
+# Больше bigint драйвер базы не примет и упадет с OverflowError
+MAX_ID = 2 ** 63 - 1
+
+
+def is_id(value):
+    """
+    Только ASCII-цифры: str.isdigit() пропускает и '²', и '٣'.
+    Значение не больше bigint.
+    """
+    return value.isascii() and value.isdigit() and int(value) <= MAX_ID
+
+
+class IdLookupMixin:
+    """ ID в пути, который не подходит под is_id, сразу дает 404 """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        lookup = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if lookup is not None and not is_id(str(lookup)):
+            raise NotFound
 
 
 class CustomPagination(PageNumberPagination):
@@ -30,17 +71,125 @@ class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
 
 
-class CustomUserViewSet(UserViewSet):
+class FeedPagination(CursorPagination):
+    """
+    Лента листается вперед по ключу (pub_date, id) последнего рецепта
+    страницы: каждая страница читается по индексу ленты, а не сортировкой
+    всех рецептов подписок.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+
+    def paginate_feed(self, request):
+        """ ID рецептов страницы ленты текущего пользователя """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        keys = get_feed_keys(
+            request.user, self.page_size + 1,
+            cursor and self.read_position(cursor.position)
+        )
+        self.has_next = len(keys) > self.page_size
+        self.keys = keys[:self.page_size]
+        return [recipe_id for _, recipe_id in self.keys]
+
+    def read_position(self, position):
+        pub_date, _, recipe_id = (position or '').rpartition(',')
+        try:
+            if not is_id(recipe_id):
+                raise ValueError
+            return datetime.datetime.fromisoformat(pub_date), int(recipe_id)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        pub_date, recipe_id = self.keys[-1]
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False,
+            position=f'{pub_date.isoformat()},{recipe_id}'
+        ))
+
+    def get_previous_link(self):
+        return None
+
+
+class UserCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = 'id'
+
+
+class CustomUserViewSet(IdLookupMixin, UserViewSet):
     """ Вьюсет пользователя """
-    queryset = User.objects.all()
+    # Удаляемый пользователь скрыт сразу, до задачи удаления
+    queryset = User.objects.filter(is_active=True)
     serializer_class = CustomUserSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
 
+    @property
+    def paginator(self):
+        """
+        Список пользователей листается курсором без COUNT по всей таблице,
+        номера страниц остаются для запросов с параметром page.
+        """
+        if not hasattr(self, '_paginator') and self.action == 'list' and (
+            'page' not in self.request.query_params
+        ):
+            self._paginator = UserCursorPagination()
+        return super().paginator
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    author=OuterRef('pk'), follower=user
+                )
+            ))
+        search = self.request.query_params.get('search', '').strip()
+        if search:
+            queryset = queryset.filter(
+                Q(username__icontains=search)
+                | Q(first_name__icontains=search)
+                | Q(last_name__icontains=search)
+            )
+        return queryset.order_by('id')
+
     def get_permissions(self):
         if self.action == 'me':
             return (IsAuthenticated(),)
         return UserViewSet.get_permissions(self)
 
+    def perform_destroy(self, instance):
+        """
+        Пользователь отключается сразу, а его рецепты и связи удаляются
+        порциями в фоне: каскад сборщика Django на больших авторах
+        не укладывается во время запроса.
+        """
+        with transaction.atomic():
+            instance.is_active = False
+            instance.save(update_fields=('is_active',))
+            delete_user_task.delay(user_id=instance.id)
+
+    @action(
+        methods=['post'],
+        detail=False,
+        url_path='events_ticket',
+        permission_classes=(IsAuthenticated,)
+    )
+    def events_ticket(self, request):
+        """ Короткоживущий билет для подключения к потоку событий """
+        return Response({
+            'ticket': make_ticket(request.user.id),
+            'expires_in': settings.EVENTS_TICKET_SECONDS,
+        })
+
     @action(
         methods=['get'],
         detail=False,
@@ -49,10 +198,26 @@ class CustomUserViewSet(UserViewSet):
     )
     def current_user_subscriptions(self, request):
         if request.method == 'GET':
-            authors = User.objects.filter(
+            authors = self.get_queryset().filter(
                 id__in=Subscription.objects.filter(
                     follower=request.user).values('author_id')
-            )
+            ).annotate(
+                recipes_count=Count('author_recipes')
+            ).order_by('id')
+            if 'recipes' in get_requested_fields(
+                request, SubscriptionListSerializer.Meta.fields
+            ):
+                # Последние рецепты всех авторов страницы одним запросом
+                recipes = Recipe.objects.only(
+                    'id', 'author_id', 'name', 'image', 'cooking_time'
+                )
+                limit = get_recipes_limit(request)
+                if limit is not None:
+                    recipes = recipes[:limit]
+                authors = authors.prefetch_related(Prefetch(
+                    'author_recipes', queryset=recipes,
+                    to_attr='subscription_recipes'
+                ))
             page = self.paginate_queryset(authors)
             serializer = SubscriptionListSerializer(
                 page,
@@ -68,7 +233,9 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscribe(self, request, id=None):
-        author = get_object_or_404(User, id=self.kwargs.get('id'))
+        author = get_object_or_404(
+            self.get_queryset(), id=self.kwargs.get('id')
+        )
         follower = request.user
         subscription = {}
         subscription['author'] = author.id
@@ -116,20 +283,143 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(IdLookupMixin, viewsets.ModelViewSet):
     """ Вьюсет Рецептов """
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.visible()
     http_method_names = ['get', 'post', 'patch', 'delete']
     permission_classes = (IsAuthorOrReadOnly, IsAuthenticatedOrReadOnly,)
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = CustomPagination
 
+    def get_requested_fields(self):
+        return get_requested_fields(self.request, RECIPE_OUTPUT_FIELDS)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'retrieve':
+            return queryset
+        fields = self.get_requested_fields()
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(get_ingredients_prefetch())
+        if 'text' not in fields:
+            queryset = queryset.defer('text')
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'list' or self.action == 'retrieve':
             return RecipeListRetrieveSerializer
         return RecipeCreateUpdateSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        """ Рецепт из общего кеша с флагами текущего пользователя """
+        if not is_id(str(kwargs['pk'])) or set(
+            request.query_params
+        ) - {'fields'}:
+            return super().retrieve(request, *args, **kwargs)
+        recipe = get_cached_recipe(int(kwargs['pk']), request)
+        if recipe is None:
+            raise Http404
+        fields = self.get_requested_fields()
+        flags = get_user_flags(recipe, request, fields)
+        headers = {'ETag': get_recipe_etag(recipe, flags, fields)}
+        last_modified = None
+        if not request.user.is_authenticated:
+            # У гостя флаги всегда ложны, и дата изменения рецепта
+            # описывает весь ответ
+            last_modified = recipe.updated_at.timestamp()
+            headers['Last-Modified'] = http_date(last_modified)
+        response = get_conditional_response(
+            request, etag=headers['ETag'], last_modified=last_modified
+        )
+        if response is not None:
+            for header, value in headers.items():
+                response[header] = value
+            return response
+        return Response(
+            represent_cached_recipe(recipe, flags, fields), headers=headers
+        )
+
+    def partial_update(self, request, *args, **kwargs):
+        """ С заголовком If-Match рецепт меняется, только если не изменился """
+        if 'If-Match' not in request.headers or not is_id(
+            str(kwargs['pk'])
+        ):
+            return super().partial_update(request, *args, **kwargs)
+        with transaction.atomic():
+            updated_at = Recipe.objects.select_for_update().filter(
+                id=kwargs['pk']
+            ).values_list('updated_at', flat=True).first()
+            if updated_at is None:
+                raise Http404
+            if not if_match_passes(
+                request.headers['If-Match'], kwargs['pk'], updated_at
+            ):
+                return Response(
+                    {'detail': 'Рецепт уже изменен, загрузите его заново'},
+                    status=status.HTTP_412_PRECONDITION_FAILED
+                )
+            return super().partial_update(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        delete_recipes([instance.id])
+
+    def get_requested_ids(self):
+        """
+        ID из параметра ids без повторов и в порядке запроса. Лишние
+        значения отсекаются до разбора, чтобы длинный параметр
+        не стоил времени.
+        """
+        values = self.request.query_params['ids'].split(
+            ',', settings.RECIPE_IDS_MAX + 1
+        )
+        if len(values) > settings.RECIPE_IDS_MAX:
+            raise ValidationError({
+                'ids': f'Не больше {settings.RECIPE_IDS_MAX} рецептов за раз'
+            })
+        values = [value.strip() for value in values]
+        for value in values:
+            if not is_id(value):
+                raise ValidationError({'ids': f'Неверный ID рецепта: {value}'})
+        return list(dict.fromkeys(map(int, values)))
+
+    def list(self, request, *args, **kwargs):
+        """ Список рецептов собирается из values() без сериализатора """
+        fields = self.get_requested_fields()
+        recipes = self.filter_queryset(
+            self.get_queryset()
+        ).values(*get_recipe_columns(fields))
+        if 'ids' in request.query_params:
+            return self.list_by_ids(recipes, fields)
+        page = self.paginate_queryset(recipes)
+        response = self.get_paginated_response(
+            represent_recipes(page, request, fields)
+        )
+        if request.query_params.get('facets') in ('1', 'true'):
+            response.data['facets'] = get_facets(recipes, request)
+        return response
+
+    def list_by_ids(self, recipes, fields):
+        """
+        Рецепты по списку ID одним запросом в порядке запроса; ID, которых
+        нет или которые не прошли фильтры, перечислены в missing.
+        """
+        ids = self.get_requested_ids()
+        found = {recipe['id']: recipe for recipe in recipes.filter(id__in=ids)}
+        return Response({
+            'results': represent_recipes(
+                [found[recipe_id] for recipe_id in ids if recipe_id in found],
+                self.request, fields
+            ),
+            'missing': [
+                recipe_id for recipe_id in ids if recipe_id not in found
+            ],
+        })
+
     @action(
         methods=['post'],
         detail=True,
@@ -188,6 +478,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='feed',
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        fields = self.get_requested_fields()
+        ids = self.paginator.paginate_feed(request)
+        recipes = {
+            recipe['id']: recipe
+            for recipe in Recipe.objects.filter(id__in=ids).values(
+                *get_recipe_columns(fields)
+            )
+        }
+        page = [
+            recipes[recipe_id] for recipe_id in ids if recipe_id in recipes
+        ]
+        return self.get_paginated_response(
+            represent_recipes(page, request, fields)
+        )
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='changes',
+        pagination_class=None
+    )
+    def changes(self, request):
+        """ Изменения после курсора since для синхронизации клиента """
+        return Response(
+            get_changes(request, request.query_params.get('since'))
+        )
+
     @action(
         methods=['get'],
         detail=False,
@@ -195,14 +520,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request, id=None):
-        response = HttpResponse(
-            content_type='text/csv',
-            headers={
-                'Content-Disposition': 'attachment; '
-                f'filename="tmp/{request.user}/shopping_cart.csv"'
-            },
-        )
-        writer = csv.writer(response)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
         ingredients = IngredientsRecipes.objects.filter(
             recipe_id__in=ShoppingCart.objects.filter(
                 user=request.user).values('recipe_id')
@@ -216,5 +535,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     f'{ingredient["ingredient__measurement_unit"]}'
                 ]
             )
-
-        return response
+        return HttpResponse(
+            buffer.getvalue(),
+            content_type='text/csv',
+            headers={'Content-Disposition': content_disposition_header(
+                True, 'shopping_cart.csv'
+            )}
+        )
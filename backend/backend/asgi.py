@@ -3,5 +3,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('WEB_PROCESS', 'True')
 
 application = get_asgi_application()
+
+# Импорт после настройки Django: модуль использует модели
+from api.events import with_events  # noqa: E402
+
+application = with_events(application)
@@ -10,6 +10,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv('SECRET_KEY', get_random_secret_key())
 DEBUG = os.getenv('DEBUG', 'False') == 'True'
 DB_ENGINE = os.getenv('DB_ENGINE', 'postgresql')
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '*').split(',')
 CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', 'http://localhost').split(',')
 AUTH_USER_MODEL = 'recipes.User'
@@ -22,6 +23,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'api',
+    'core',
     'recipes',
     'rest_framework',
     'rest_framework.authtoken',
@@ -32,6 +34,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,6 +45,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -60,12 +67,28 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
+
+# Пул соединений: 'none' - постоянные соединения Django,
+# 'pgbouncer' - внешний пулер в режиме транзакций
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'none')
+# Для ASGI соединения привязаны к потокам, держать их открытыми нельзя
+DB_CONN_MAX_AGE = int(os.getenv(
+    'DB_CONN_MAX_AGE',
+    0 if SERVER_MODE == 'asgi' or DB_POOL_MODE == 'pgbouncer' else 60
+))
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+# Ограничение времени запроса только для веб-процессов: WEB_PROCESS
+# выставляют wsgi.py и asgi.py. Миграции, команды и воркер задач
+# выполняют долгие запросы и работают без ограничения
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 30000))
+WEB_PROCESS = os.getenv('WEB_PROCESS', 'False') == 'True'
 
 if DB_ENGINE == 'sqlite':
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.getenv('SQLITE_NAME', BASE_DIR / 'db.sqlite3'),
         }
     }
 elif DB_ENGINE == 'postgresql':
@@ -76,9 +99,69 @@ elif DB_ENGINE == 'postgresql':
             'USER': os.getenv('POSTGRES_USER', 'django'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
             'HOST': os.getenv('DB_HOST', 'localhost'),
-            'PORT': os.getenv('DB_PORT', 5432)
+            'PORT': os.getenv('DB_PORT', 5432),
+            'OPTIONS': {},
+        }
+    }
+    if DB_POOL_MODE == 'pgbouncer':
+        # pgbouncer не сохраняет курсоры и параметры сессии между
+        # транзакциями, statement_timeout задается в БД для роли,
+        # под которой работают веб-процессы
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    elif DB_STATEMENT_TIMEOUT and WEB_PROCESS:
+        DATABASES['default']['OPTIONS']['options'] = (
+            f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'
+        )
+
+DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+DATABASES['default']['CONN_HEALTH_CHECKS'] = DB_CONN_HEALTH_CHECKS
+
+# Реплики для чтения: хосты PostgreSQL или файлы SQLite через запятую
+DB_REPLICAS = [
+    replica for replica in os.getenv('DB_REPLICA_HOSTS', '').split(',') if replica
+]
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+DB_REPLICA_PIN_COOKIE = 'replica_pin'
+DATABASE_REPLICAS = []
+for number, replica in enumerate(DB_REPLICAS):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DB_ENGINE == 'sqlite':
+        DATABASES[alias]['NAME'] = replica
+    else:
+        DATABASES[alias].update({
+            'HOST': replica,
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'USER': os.getenv(
+                'DB_REPLICA_USER', DATABASES['default']['USER']
+            ),
+            'PASSWORD': os.getenv(
+                'DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']
+            ),
+        })
+    DATABASE_REPLICAS.append(alias)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
+# Общий кеш процессов: без него версии ключей видит только процесс,
+# который их сменил, и кеши по версиям (фасеты) не используются
+SHARED_CACHE = bool(os.getenv('REDIS_URL'))
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -116,7 +199,11 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -126,6 +213,10 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# С локальным кешем сброс виден только в своем процессе, остальные
+# процессы увидят выход или смену пароля не позже, чем через это время
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60))
+
 DJOSER = {
     'SERIALIZERS': {
         'user': 'api.serializers.CustomUserSerializer',
@@ -140,3 +231,80 @@ DJOSER = {
 
 
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 3000
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 600))
+RECIPE_IDS_MAX = int(os.getenv('RECIPE_IDS_MAX', 50))
+# Верхние границы интервалов времени приготовления для фасетов, в минутах
+RECIPE_COOKING_TIME_BUCKETS = (15, 30, 60)
+RECIPE_FACET_AUTHORS = int(os.getenv('RECIPE_FACET_AUTHORS', 10))
+RECIPE_FACETS_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FACETS_CACHE_TIMEOUT', 300)
+)
+
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 10000))
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', 50))
+
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False') == 'True'
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+# Максимальная пауза после ошибок подряд в цикле воркера, в секундах
+JOBS_MAX_BACKOFF = float(os.getenv('JOBS_MAX_BACKOFF', 60))
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', 600))
+JOBS_KEEP_DONE_DAYS = int(os.getenv('JOBS_KEEP_DONE_DAYS', 7))
+# Периодические задачи: имя задачи и интервал запуска в секундах
+JOBS_PERIODIC = {
+    'recipes.prune_changelog': 3600,
+}
+
+# Поток событий (SSE) обслуживает только ASGI-приложение, см. asgi.py.
+# LocalBroker рассылает события внутри процесса, для нескольких
+# процессов и воркера задач нужен RedisBroker.
+EVENTS_PATH = '/api/events/'
+EVENTS_REDIS_URL = os.getenv('REDIS_URL')
+EVENTS_BROKER = os.getenv(
+    'EVENTS_BROKER',
+    'core.pubsub.RedisBroker' if EVENTS_REDIS_URL
+    else 'core.pubsub.LocalBroker'
+)
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', 15))
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))
+EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', 5000))
+EVENTS_RECONNECT_DELAY = float(os.getenv('EVENTS_RECONNECT_DELAY', 1))
+# Срок билета на подключение к потоку событий, в секундах
+EVENTS_TICKET_SECONDS = int(os.getenv('EVENTS_TICKET_SECONDS', 60))
+
+# Размер порции строк при фоновом удалении пользователя
+DELETION_CHUNK_SIZE = int(os.getenv('DELETION_CHUNK_SIZE', 500))
+
+CHANGES_PAGE_SIZE = int(os.getenv('CHANGES_PAGE_SIZE', 500))
+CHANGES_KEEP_DAYS = int(os.getenv('CHANGES_KEEP_DAYS', 30))
+# Сколько перечитывать ID журнала, запись которых еще не закоммичена
+CHANGES_GAP_SECONDS = int(os.getenv('CHANGES_GAP_SECONDS', 600))
+CHANGES_MAX_GAPS = int(os.getenv('CHANGES_MAX_GAPS', 100))
+
+ASYNC_READ_VIEWS = SERVER_MODE == 'asgi'
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)) == 'True'
+# Без токена /api/metrics/ отвечает 404
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Общий каталог, через который метрики собираются со всех воркеров;
+# пусто — метрики только процесса, обработавшего запрос
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+# Доля запросов, которые профилируются и сохраняются в PROFILING_DIR
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', 100))
+# Интервал семплирования стеков для ?_profile=collapsed, в секундах
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', 0.001))
+# Запросы дольше SLOW_QUERY_THRESHOLD миллисекунд пишутся в SlowQuery
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'False') == 'True'
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 200))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'True') == 'True'
+# Максимум SQL-запросов на маршрут, например {'api:recipes-list': 10}
+QUERY_BUDGETS = {}
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', str(DEBUG)) == 'True'
@@ -0,0 +1,35 @@
+from django.contrib import admin
+
+from .models import Job, SlowQuery
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'name',
+        'status',
+        'attempts',
+        'run_at',
+        'finished_at',
+    )
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'locked_at', 'finished_at')
+
+
+admin.site.register(Job, JobAdmin)
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = (
+        'fingerprint',
+        'view',
+        'calls',
+        'total_time',
+        'max_time',
+        'last_seen',
+    )
+    list_filter = ('view',)
+    search_fields = ('fingerprint',)
+    readonly_fields = ('digest', 'first_seen', 'last_seen')
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import autodiscover_modules
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+    verbose_name = 'Служебное'
+
+    def ready(self):
+        from core.instrumentation import install_query_recorder
+        from core.slowqueries import install_slow_query_log
+        connection_created.connect(install_query_recorder)
+        connection_created.connect(install_slow_query_log)
+        autodiscover_modules('tasks')
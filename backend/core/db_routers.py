@@ -0,0 +1,38 @@
+import contextlib
+import contextvars
+import random
+
+from django.conf import settings
+
+use_primary = contextvars.ContextVar('use_primary', default=False)
+# Модели, которые всегда читаются из основной БД: токен нужен сразу
+# после входа, когда реплика может его еще не получить
+PRIMARY_MODELS = ('authtoken.token',)
+
+
+@contextlib.contextmanager
+def primary_db():
+    """ Все чтения внутри блока идут в основную БД """
+    token = use_primary.set(True)
+    try:
+        yield
+    finally:
+        use_primary.reset(token)
+
+
+class ReplicaRouter:
+    """ Чтение с реплик, запись и чтение после записи - в основную БД """
+
+    def db_for_read(self, model, **hints):
+        if use_primary.get() or model._meta.label_lower in PRIMARY_MODELS:
+            return 'default'
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,7 @@
+from django.core.files.storage import default_storage
+
+
+def delete_media_files(names):
+    """ Удаляет файлы из MEDIA_ROOT, отсутствующие файлы пропускаются """
+    for name in names:
+        default_storage.delete(name)
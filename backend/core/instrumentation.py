@@ -0,0 +1,190 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+current_metrics = contextvars.ContextVar('current_metrics', default=None)
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    """ Счетчики SQL-запросов и времени обработки одного запроса """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+    @property
+    def route(self):
+        """ Имя маршрута, когда URL уже разобран """
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    @property
+    def duplicates(self):
+        return sum(
+            count - 1 for count in self.statements.values() if count > 1
+        )
+
+    def record(self, sql, params, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.statements[(sql, repr(params))] += 1
+
+
+def record_query(execute, sql, params, many, context):
+    """ Обертка выполнения запросов, учитывающая их в метриках запроса """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record(sql, params, time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield str(bound), cumulative
+        yield '+Inf', cumulative + self.counts[-1]
+
+
+class MetricsRegistry:
+    """
+    Гистограммы по маршрутам в памяти процесса. С METRICS_DIR каждый
+    процесс раз в METRICS_FLUSH_INTERVAL секунд сбрасывает свои
+    гистограммы в файл каталога, а render() складывает файлы всех
+    процессов: иначе под несколькими воркерами gunicorn каждый сбор
+    метрик видел бы только один случайный воркер.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(dict)
+        self.flushed_at = 0.0
+
+    def observe(self, name, labels, value, buckets):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            histogram = self.histograms[name].get(key)
+            if histogram is None:
+                histogram = self.histograms[name][key] = Histogram(buckets)
+            histogram.observe(value)
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if settings.METRICS_DIR and (
+            time.monotonic() - self.flushed_at > interval
+        ):
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                [name, key, histogram.buckets, list(histogram.counts),
+                 histogram.total]
+                for name, series in self.histograms.items()
+                for key, histogram in series.items()
+            ]
+
+    def flush(self):
+        """ Атомарно записывает гистограммы процесса в METRICS_DIR """
+        self.flushed_at = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """ Гистограммы всех процессов из METRICS_DIR или только свои """
+        if not settings.METRICS_DIR:
+            return self.snapshot()
+        self.flush()
+        entries = []
+        for name in os.listdir(settings.METRICS_DIR):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, name)) as file:
+                    entries += json.load(file)
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def render(self):
+        merged = defaultdict(dict)
+        for name, key, buckets, counts, total in self.collect():
+            key = tuple(map(tuple, key))
+            histogram = merged[name].get(key)
+            if histogram is None:
+                histogram = merged[name][key] = Histogram(tuple(buckets))
+            histogram.counts = [
+                a + b for a, b in zip(histogram.counts, counts)
+            ]
+            histogram.total += total
+        lines = []
+        for name, series in sorted(merged.items()):
+            lines.append(f'# TYPE {name} histogram')
+            for key, histogram in sorted(series.items()):
+                labels = ','.join(f'{k}="{v}"' for k, v in key)
+                for bound, count in histogram.samples():
+                    lines.append(
+                        f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+                    )
+                lines.append(f'{name}_sum{{{labels}}} {histogram.total}')
+                lines.append(
+                    f'{name}_count{{{labels}}} {sum(histogram.counts)}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def check_query_budget(route, metrics):
+    budget = settings.QUERY_BUDGETS.get(route)
+    if budget is None or metrics.queries <= budget:
+        return
+    message = (
+        f'Маршрут {route} выполнил {metrics.queries} SQL-запросов '
+        f'при бюджете {budget}'
+    )
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request database connection overhead'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--queries', type=int, default=3)
+
+    def run_requests(self, conn_max_age, requests, queries):
+        """ Имитируем цикл запросов так же, как его видит Django """
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        started = time.perf_counter()
+        for _ in range(requests):
+            close_old_connections()
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute('SELECT 1')
+            close_old_connections()
+        return (time.perf_counter() - started) * 1000 / requests
+
+    def handle(self, *args, **options):
+        conn_max_age = connection.settings_dict['CONN_MAX_AGE']
+        try:
+            fresh = self.run_requests(
+                0, options['requests'], options['queries']
+            )
+            persistent = self.run_requests(
+                None, options['requests'], options['queries']
+            )
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        self.stdout.write(
+            f'Новое соединение на запрос: {fresh:.3f} мс\n'
+            f'Постоянное соединение: {persistent:.3f} мс\n'
+            f'Экономия на запрос: {fresh - persistent:.3f} мс'
+        )
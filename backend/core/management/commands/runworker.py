@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run background job worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--poll-interval', type=float, default=None)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'Воркер запущен: процессов {options["processes"]}, '
+            f'потоков {options["threads"]}'
+        )
+        Worker(
+            threads=options['threads'],
+            processes=options['processes'],
+            poll_interval=options['poll_interval']
+        ).run()
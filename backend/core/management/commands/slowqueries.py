@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from core.models import SlowQuery
+
+ORDERINGS = {
+    'total': '-total_time',
+    'max': '-max_time',
+    'calls': '-calls',
+}
+
+
+class Command(BaseCommand):
+    help = 'Report slow query fingerprints ordered by total time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--order', choices=tuple(ORDERINGS), default='total'
+        )
+        parser.add_argument('--view', default=None)
+        parser.add_argument('--plans', action='store_true')
+        parser.add_argument('--reset', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(f'Удалено отпечатков: {deleted}')
+            return
+        queries = SlowQuery.objects.order_by(ORDERINGS[options['order']])
+        if options['view']:
+            queries = queries.filter(view=options['view'])
+        for query in queries[:options['limit']]:
+            self.stdout.write(
+                f'total={query.total_time * 1000:<10.1f} '
+                f'max={query.max_time * 1000:<9.1f} '
+                f'avg={query.total_time * 1000 / query.calls:<9.1f} '
+                f'calls={query.calls:<6} view={query.view or "-"}\n'
+                f'    {query.fingerprint}'
+            )
+            if options['plans'] and query.plan:
+                for line in query.plan.splitlines():
+                    self.stdout.write(f'    | {line}')
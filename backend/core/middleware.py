@@ -0,0 +1,326 @@
+import cProfile
+import hashlib
+import random
+import threading
+import time
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from core.db_routers import use_primary
+from core.instrumentation import (DURATION_BUCKETS, QUERY_COUNT_BUCKETS,
+                                  RequestMetrics, check_query_budget,
+                                  current_metrics, registry)
+from core.profiling import (PROFILE_PARAM, StackSampler, dump_pstats,
+                            get_profile_mode, is_staff_request, store_profile)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Только ответы API: в HTML админки есть CSRF-токен, а сжатие страниц
+# с секретом и отраженным вводом открывает атаку BREACH
+COMPRESSIBLE_TYPES = ('application/json',)
+
+
+def get_accepted_encodings(header):
+    """ Кодировки из Accept-Encoding с ненулевым q """
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        params = params.strip().replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1
+        except ValueError:
+            quality = 0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class HybridMiddleware:
+    """
+    Основа middleware для WSGI и ASGI. Под ASGI цепочка остается
+    асинхронной, и Django не переводит ее целиком в поток: иначе
+    асинхронные вью и вынос в пул потоков теряют смысл.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        return self.call(request)
+
+
+class ReplicaPinningMiddleware(HybridMiddleware):
+    """
+    Изменяющие запросы и чтения того же клиента в течение
+    DB_REPLICA_STICKY_SECONDS после записи обслуживаются основной БД,
+    чтобы клиент видел свои изменения несмотря на задержку репликации.
+    Признак записи хранится в короткой cookie, которую видят все
+    воркеры, и в кеше по учетным данным для клиентов без cookie;
+    кеш помогает, только если он общий (REDIS_URL).
+    """
+
+    def get_sticky_key(self, request):
+        credentials = (
+            request.headers.get('Authorization')
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        )
+        if not credentials:
+            return None
+        digest = hashlib.sha256(credentials.encode()).hexdigest()
+        return f'replica-pin:{digest}'
+
+    def is_pinned(self, request):
+        return (
+            request.method not in SAFE_METHODS
+            or settings.DB_REPLICA_PIN_COOKIE in request.COOKIES
+        )
+
+    def call(self, request):
+        key = self.get_sticky_key(request)
+        token = use_primary.set(
+            self.is_pinned(request) or bool(key and cache.get(key))
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            self.pin(response, key)
+        return response
+
+    async def acall(self, request):
+        key = self.get_sticky_key(request)
+        token = use_primary.set(
+            self.is_pinned(request) or bool(key and await cache.aget(key))
+        )
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            self.pin(response, key)
+            if key:
+                await cache.aset(
+                    key, True, settings.DB_REPLICA_STICKY_SECONDS
+                )
+        return response
+
+    def pin(self, response, key):
+        # Вход по токену идет без Authorization, поэтому cookie ставится
+        # на любую успешную запись
+        response.set_cookie(
+            settings.DB_REPLICA_PIN_COOKIE, '1',
+            max_age=settings.DB_REPLICA_STICKY_SECONDS,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax'
+        )
+        if key and not self.is_async:
+            cache.set(key, True, settings.DB_REPLICA_STICKY_SECONDS)
+
+
+class RequestMetricsMiddleware(HybridMiddleware):
+    """
+    Считает SQL-запросы, дубликаты и время в БД для каждого запроса,
+    отдает их в заголовке Server-Timing и копит гистограммы по маршрутам.
+    """
+
+    def call(self, request):
+        metrics = RequestMetrics(request)
+        token = current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def acall(self, request):
+        metrics = RequestMetrics(request)
+        token = current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def finish(self, request, response, metrics, started):
+        total_time = time.perf_counter() - started
+        route = metrics.route or 'unmatched'
+        labels = {'route': route, 'method': request.method}
+        registry.observe(
+            'http_request_duration_seconds', labels,
+            total_time, DURATION_BUCKETS
+        )
+        registry.observe(
+            'http_request_db_seconds', labels,
+            metrics.db_time, DURATION_BUCKETS
+        )
+        registry.observe(
+            'http_request_db_queries', labels,
+            metrics.queries, QUERY_COUNT_BUCKETS
+        )
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={metrics.db_time * 1000:.1f};'
+                f'desc="{metrics.queries} queries, '
+                f'{metrics.duplicates} duplicates"',
+                f'app;dur={(total_time - metrics.db_time) * 1000:.1f};'
+                'desc="views, serializers and rendering"',
+                f'total;dur={total_time * 1000:.1f}',
+            ))
+        check_query_budget(route, metrics)
+        return response
+
+
+class CompressionMiddleware(HybridMiddleware):
+    """
+    Сжимает ответы больше COMPRESSION_MIN_SIZE байт в brotli или gzip
+    по заголовку Accept-Encoding клиента. Сжимается только JSON API,
+    gzip — как в GZipMiddleware, со случайным заполнением заголовка
+    против BREACH. Потоковые ответы не трогает, чтобы не буферизовать
+    их целиком.
+    """
+
+    def get_encoding(self, request):
+        accepted = get_accepted_encodings(
+            request.headers.get('Accept-Encoding', '')
+        )
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted or '*' in accepted:
+            return 'gzip'
+        return None
+
+    def compress(self, content, encoding):
+        if encoding == 'br':
+            return brotli.compress(
+                content, quality=settings.COMPRESSION_BROTLI_QUALITY
+            )
+        return compress_string(
+            content, max_random_bytes=GZipMiddleware.max_random_bytes
+        )
+
+    def call(self, request):
+        return self.process_response(request, self.get_response(request))
+
+    async def acall(self, request):
+        return self.process_response(
+            request, await self.get_response(request)
+        )
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(
+                COMPRESSIBLE_TYPES
+            )
+            or len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.get_encoding(request)
+        if encoding is None:
+            return response
+        content = self.compress(response.content, encoding)
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        return response
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Профилирование по запросу: сотрудник добавляет ?_profile=1 (или
+    заголовок X-Profile) и получает вместо ответа файл pstats, а
+    с ?_profile=collapsed — свернутые стеки семплирующего профилировщика.
+    Доля PROFILING_SAMPLE_RATE всех запросов профилируется молча
+    и сохраняется в PROFILING_DIR. Без параметра и с нулевой долей
+    запрос проходит без профилировщика.
+
+    Под ASGI вью выполняется в другом потоке, чем middleware, а cProfile
+    видит только свой поток. Поэтому там отдаются только свернутые
+    стеки всех потоков процесса, а PROFILING_SAMPLE_RATE не действует.
+    """
+
+    def call(self, request):
+        mode = get_profile_mode(request)
+        if mode is not None and is_staff_request(request):
+            return self.profile(request, mode)
+        if settings.PROFILING_SAMPLE_RATE and (
+            random.random() < settings.PROFILING_SAMPLE_RATE
+        ):
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+            store_profile(profiler, request, response)
+            return response
+        return self.get_response(request)
+
+    async def acall(self, request):
+        mode = get_profile_mode(request)
+        if mode is None or not await sync_to_async(is_staff_request)(
+            request
+        ):
+            return await self.get_response(request)
+        self.strip_param(request)
+        with StackSampler(None, settings.PROFILING_INTERVAL) as sampler:
+            response = await self.get_response(request)
+        return self.make_report(response, sampler.collapsed(), 'collapsed')
+
+    def strip_param(self, request):
+        # Параметр не должен менять путь запроса, например обход кешей
+        request.GET = request.GET.copy()
+        request.GET.pop(PROFILE_PARAM, None)
+
+    def profile(self, request, mode):
+        self.strip_param(request)
+        if mode == 'collapsed':
+            with StackSampler(
+                threading.get_ident(), settings.PROFILING_INTERVAL
+            ) as sampler:
+                response = self.get_response(request)
+            return self.make_report(response, sampler.collapsed(), mode)
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        return self.make_report(response, dump_pstats(profiler), mode)
+
+    def make_report(self, response, content, mode):
+        if mode == 'collapsed':
+            report = HttpResponse(
+                content, content_type='text/plain; charset=utf-8'
+            )
+        else:
+            report = HttpResponse(
+                content, content_type='application/octet-stream'
+            )
+            report['Content-Disposition'] = (
+                'attachment; filename="profile.prof"'
+            )
+        report['X-Profiled-Status'] = str(response.status_code)
+        report['Cache-Control'] = 'no-store'
+        return report
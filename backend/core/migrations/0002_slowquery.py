@@ -0,0 +1,34 @@
+# Generated by Django 4.2.8 on 2026-10-19 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=32, unique=True, verbose_name='Хеш отпечатка')),
+                ('fingerprint', models.TextField(help_text='Запрос с литералами, замененными на ?', verbose_name='Отпечаток')),
+                ('example', models.TextField(verbose_name='Пример запроса')),
+                ('view', models.CharField(blank=True, help_text='Маршрут последнего медленного вызова', max_length=200, verbose_name='Маршрут')),
+                ('calls', models.PositiveIntegerField(default=1, verbose_name='Количество вызовов')),
+                ('total_time', models.FloatField(verbose_name='Суммарное время, с')),
+                ('max_time', models.FloatField(verbose_name='Максимальное время, с')),
+                ('plan', models.TextField(blank=True, verbose_name='План запроса')),
+                ('first_seen', models.DateTimeField(verbose_name='Первый вызов')),
+                ('last_seen', models.DateTimeField(verbose_name='Последний вызов')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-total_time',),
+            },
+        ),
+    ]
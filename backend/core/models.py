@@ -0,0 +1,121 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """ Модель фоновой задачи """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Выполнена'
+        FAILED = 'failed', 'Ошибка'
+
+    name = models.CharField(
+        max_length=200,
+        verbose_name='Задача'
+    )
+    payload = models.JSONField(
+        default=dict,
+        verbose_name='Параметры'
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Количество попыток'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=5,
+        verbose_name='Максимум попыток'
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Время запуска'
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Время захвата воркером'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Дата завершения'
+    )
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('run_at',)
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'],
+                name='job_status_run_at_idx',
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.name} ({self.status})'
+
+
+class SlowQuery(models.Model):
+    """ Модель статистики медленных запросов по отпечаткам """
+    digest = models.CharField(
+        max_length=32,
+        unique=True,
+        verbose_name='Хеш отпечатка'
+    )
+    fingerprint = models.TextField(
+        verbose_name='Отпечаток',
+        help_text='Запрос с литералами, замененными на ?'
+    )
+    example = models.TextField(
+        verbose_name='Пример запроса'
+    )
+    view = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name='Маршрут',
+        help_text='Маршрут последнего медленного вызова'
+    )
+    calls = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Количество вызовов'
+    )
+    total_time = models.FloatField(
+        verbose_name='Суммарное время, с'
+    )
+    max_time = models.FloatField(
+        verbose_name='Максимальное время, с'
+    )
+    plan = models.TextField(
+        blank=True,
+        verbose_name='План запроса'
+    )
+    first_seen = models.DateTimeField(
+        verbose_name='Первый вызов'
+    )
+    last_seen = models.DateTimeField(
+        verbose_name='Последний вызов'
+    )
+
+    class Meta:
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        ordering = ('-total_time',)
+
+    def __str__(self) -> str:
+        return self.fingerprint[:100]
@@ -0,0 +1,135 @@
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile'
+# Режимы ?_profile=: cProfile с выгрузкой pstats или семплирование стеков
+CPROFILE_MODES = ('1', 'true', 'pstats')
+SAMPLING_MODES = ('collapsed', 'sample')
+
+
+def get_profile_mode(request):
+    mode = request.GET.get(PROFILE_PARAM) or request.headers.get(
+        PROFILE_HEADER
+    )
+    if mode is None:
+        return None
+    mode = mode.lower()
+    if mode in CPROFILE_MODES:
+        return 'pstats'
+    if mode in SAMPLING_MODES:
+        return 'collapsed'
+    return None
+
+
+def is_staff_request(request):
+    """
+    Проверка прав до вызова DRF: пользователь сессии или токена из
+    DEFAULT_AUTHENTICATION_CLASSES.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except exceptions.APIException:
+            return False
+        if result is not None:
+            return result[0].is_active and result[0].is_staff
+    return False
+
+
+def dump_pstats(profiler):
+    """ Статистика в формате файла pstats, как Profile.dump_stats() """
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+def format_frame(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """
+    Снимает стек потока запроса каждые PROFILING_INTERVAL секунд из
+    отдельного потока. Результат — свернутые стеки для flamegraph.pl
+    и speedscope: «корень;...;лист число». С thread_id=None снимаются
+    стеки всех потоков процесса, корнем стека служит имя потока.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                self.sample(frames.get(self.thread_id))
+                continue
+            names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for thread_id, frame in frames.items():
+                if thread_id != self.thread.ident:
+                    self.sample(frame, names.get(thread_id, str(thread_id)))
+
+    def sample(self, frame, root=None):
+        stack = []
+        while frame is not None:
+            stack.append(format_frame(frame))
+            frame = frame.f_back
+        if root is not None:
+            stack.append(root)
+        if stack:
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.thread.join()
+
+    def collapsed(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        ).encode()
+
+
+def store_profile(profiler, request, response):
+    """
+    Сохраняет профиль в PROFILING_DIR и удаляет самые старые файлы
+    сверх PROFILING_KEEP.
+    """
+    match = getattr(request, 'resolver_match', None)
+    route = match.view_name if match else 'unmatched'
+    name = (
+        f'{time.time_ns()}-{route.replace(":", ".")}-'
+        f'{request.method}-{response.status_code}.prof'
+    )
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(settings.PROFILING_DIR, name))
+    names = sorted(
+        name for name in os.listdir(settings.PROFILING_DIR)
+        if name.endswith('.prof')
+    )
+    for name in names[:-settings.PROFILING_KEEP]:
+        try:
+            os.remove(os.path.join(settings.PROFILING_DIR, name))
+        except FileNotFoundError:
+            pass
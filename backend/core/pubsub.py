@@ -0,0 +1,151 @@
+import asyncio
+import functools
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+    from redis import asyncio as aioredis
+except ImportError:
+    redis = aioredis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_PREFIX = 'events:'
+
+
+class Subscription:
+    """
+    Подписка одного соединения на набор каналов. Сообщения копятся
+    в очереди event loop соединения; при переполнении лишние
+    отбрасываются, чтобы медленный клиент не держал память.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+        self.channels = set()
+
+    def add(self, *channels):
+        self.broker.attach(self, channels)
+        self.channels.update(channels)
+
+    def remove(self, *channels):
+        self.broker.detach(self, channels)
+        self.channels.difference_update(channels)
+
+    def close(self):
+        self.remove(*self.channels)
+
+    def deliver(self, channel, message):
+        """ Вызывается из любого потока """
+        self.loop.call_soon_threadsafe(self.put, channel, message)
+
+    def put(self, channel, message):
+        if self.queue.full():
+            logger.warning('Очередь событий переполнена, событие пропущено')
+            return
+        self.queue.put_nowait((channel, message))
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class LocalBroker:
+    """
+    Рассылка событий внутри процесса. Подходит, когда события
+    публикуются в том же процессе, где открыты соединения.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def attach(self, subscription, channels):
+        with self.lock:
+            for channel in channels:
+                self.subscribers[channel].add(subscription)
+
+    def detach(self, subscription, channels):
+        with self.lock:
+            for channel in channels:
+                subscribers = self.subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[channel]
+
+    def dispatch(self, channel, message):
+        with self.lock:
+            subscribers = tuple(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(channel, message)
+
+    def publish(self, channel, message):
+        self.dispatch(channel, message)
+
+    def subscribe(self):
+        return Subscription(self)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Публикация через Redis для нескольких процессов и воркера задач.
+    Процесс держит одну подписку на все каналы и раздает сообщения
+    своим соединениям, а не открывает соединение Redis на каждого
+    клиента.
+    """
+
+    def __init__(self):
+        super().__init__()
+        if redis is None:
+            raise ImportError('Для RedisBroker нужен пакет redis')
+        self.client = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+        self.listener = None
+
+    def publish(self, channel, message):
+        self.client.publish(REDIS_PREFIX + channel, json.dumps(message))
+
+    def subscribe(self):
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.get_running_loop().create_task(
+                self.listen()
+            )
+        return super().subscribe()
+
+    async def listen(self):
+        client = aioredis.Redis.from_url(settings.EVENTS_REDIS_URL)
+        while True:
+            try:
+                async with client.pubsub(
+                    ignore_subscribe_messages=True
+                ) as pubsub:
+                    await pubsub.psubscribe(REDIS_PREFIX + '*')
+                    async for message in pubsub.listen():
+                        channel = message['channel'].decode()
+                        self.dispatch(
+                            channel[len(REDIS_PREFIX):],
+                            json.loads(message['data'])
+                        )
+            except redis.RedisError:
+                logger.exception('Потеряна подписка на события Redis')
+                await asyncio.sleep(settings.EVENTS_RECONNECT_DELAY)
+
+
+@functools.lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.EVENTS_BROKER)()
+
+
+def publish(channel, message):
+    """ Публикует событие, ошибка брокера не ломает запрос """
+    try:
+        get_broker().publish(channel, message)
+    except Exception:
+        logger.exception('Не удалось опубликовать событие в %s', channel)
@@ -0,0 +1,172 @@
+import contextvars
+import hashlib
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, router, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.instrumentation import current_metrics
+
+logger = logging.getLogger(__name__)
+
+# Запросы самого журнала не должны попадать в журнал
+recording = contextvars.ContextVar('recording_slow_query', default=False)
+# Отпечатки, для которых план уже снят в этом процессе. Набор
+# очищается, когда в нем больше EXPLAINED_MAX отпечатков
+explained = set()
+EXPLAINED_MAX = 1000
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+LIST_RE = re.compile(r'\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)')
+SPACE_RE = re.compile(r'\s+')
+# Управление транзакцией: запись журнала внутри BEGIN вложила бы
+# транзакцию в транзакцию
+TRANSACTION_RE = re.compile(
+    r'^(?:(?:RELEASE |ROLLBACK TO )?SAVEPOINT |BEGIN|COMMIT|ROLLBACK)',
+    re.IGNORECASE
+)
+
+
+def normalize_sql(sql):
+    """
+    Отпечаток запроса: литералы заменены на ?, списки IN (...) свернуты,
+    пробелы схлопнуты. Запросы, которые различаются только параметрами,
+    получают один отпечаток.
+    """
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = LIST_RE.sub('(...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def get_digest(fingerprint):
+    return hashlib.sha256(fingerprint.encode()).hexdigest()[:32]
+
+
+def get_explain_prefix(connection):
+    if connection.vendor == 'postgresql':
+        return 'EXPLAIN (ANALYZE off) '
+    if connection.vendor == 'sqlite':
+        return 'EXPLAIN QUERY PLAN '
+    return 'EXPLAIN '
+
+
+def explain(connection, sql, params):
+    """ План запроса без его выполнения или пустая строка при ошибке """
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(get_explain_prefix(connection) + sql, params)
+                return '\n'.join(
+                    ' '.join(map(str, row)) for row in cursor.fetchall()
+                )
+    except DatabaseError:
+        return ''
+
+
+def save_slow_query(digest, fingerprint, sql, view, duration, plan):
+    """ Добавляет вызов к статистике отпечатка в таблице SlowQuery """
+    from core.models import SlowQuery
+
+    now = timezone.now()
+    with transaction.atomic(using=router.db_for_write(SlowQuery)):
+        updated = SlowQuery.objects.filter(digest=digest).update(
+            calls=F('calls') + 1,
+            total_time=F('total_time') + duration,
+            max_time=Greatest('max_time', duration),
+            view=view,
+            last_seen=now,
+            **({'plan': plan} if plan else {})
+        )
+        if not updated:
+            SlowQuery.objects.create(
+                digest=digest,
+                fingerprint=fingerprint,
+                example=sql,
+                view=view,
+                total_time=duration,
+                max_time=duration,
+                plan=plan,
+                first_seen=now,
+                last_seen=now
+            )
+
+
+def save_recorded(*args):
+    """
+    Вызывается после фиксации транзакции запроса: блокировка строки
+    отпечатка не держится до конца чужой транзакции, а откат запроса
+    не откатывает его статистику.
+    """
+    token = recording.set(True)
+    try:
+        save_slow_query(*args)
+    except DatabaseError:
+        logger.exception('Не удалось записать медленный запрос')
+    finally:
+        recording.reset(token)
+
+
+def record_slow_query(sql, params, duration, connection):
+    """
+    Пишет запрос медленнее SLOW_QUERY_THRESHOLD в журнал и в таблицу
+    отпечатков после фиксации транзакции. План SELECT-запроса снимается
+    один раз на отпечаток в процессе.
+    """
+    fingerprint = normalize_sql(sql)
+    digest = get_digest(fingerprint)
+    metrics = current_metrics.get()
+    view = getattr(metrics, 'route', None) or ''
+    logger.warning(
+        'Медленный запрос %.1f мс в %s: %s',
+        duration * 1000, view or '-', fingerprint
+    )
+    plan = ''
+    if settings.SLOW_QUERY_EXPLAIN and digest not in explained and (
+        sql.lstrip()[:6].upper() == 'SELECT'
+    ):
+        if len(explained) >= EXPLAINED_MAX:
+            explained.clear()
+        explained.add(digest)
+        plan = explain(connection, sql, params)
+    transaction.on_commit(
+        lambda: save_recorded(digest, fingerprint, sql, view, duration, plan),
+        using=connection.alias
+    )
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """
+    Обертка выполнения запросов для журнала медленных запросов. Ошибка
+    записи в журнал не ломает запрос: план снимается в точке сохранения,
+    а статистика пишется после фиксации транзакции.
+    """
+    if recording.get() or not settings.SLOW_QUERY_LOG:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    if duration * 1000 < settings.SLOW_QUERY_THRESHOLD or many or (
+        TRANSACTION_RE.match(sql)
+    ):
+        return result
+    token = recording.set(True)
+    try:
+        record_slow_query(sql, params, duration, context['connection'])
+    except DatabaseError:
+        logger.exception('Не удалось записать медленный запрос')
+    finally:
+        recording.reset(token)
+    return result
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_slow_queries)
@@ -0,0 +1,128 @@
+import datetime
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    """ Зарегистрированная фоновая задача """
+
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def delay(self, countdown=0, **kwargs):
+        """ Ставим задачу в очередь, параметры сериализуются в JSON """
+        if settings.JOBS_EAGER:
+            transaction.on_commit(lambda: self.func(**kwargs))
+            return None
+        return Job.objects.create(
+            name=self.name,
+            payload=kwargs,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + datetime.timedelta(seconds=countdown)
+        )
+
+
+def task(name=None, max_attempts=None):
+    """ Декоратор регистрации функции как фоновой задачи """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = Task(
+            func,
+            task_name,
+            max_attempts or settings.JOBS_MAX_ATTEMPTS
+        )
+        return registry[task_name]
+    return decorator
+
+
+def claim_job():
+    """ Захватываем ближайшую задачу, пропуская заблокированные строки """
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.Status.PENDING,
+            run_at__lte=timezone.now()
+        ).order_by('run_at', 'id').first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(
+            id=job.id, status=Job.Status.PENDING
+        ).update(
+            status=Job.Status.RUNNING,
+            attempts=job.attempts + 1,
+            locked_at=timezone.now()
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """ Выполняем задачу, при ошибке откладываем повтор """
+    try:
+        registry[job.name](**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.Status.PENDING
+            job.run_at = timezone.now() + datetime.timedelta(
+                seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            )
+        else:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+        logger.exception('Ошибка в задаче %s (#%s)', job.name, job.id)
+    else:
+        job.status = Job.Status.DONE
+        job.finished_at = timezone.now()
+    job.locked_at = None
+    job.save(update_fields=(
+        'status', 'run_at', 'locked_at', 'finished_at', 'last_error'
+    ))
+
+
+def release_stale_jobs():
+    """ Возвращаем в очередь задачи, зависшие после падения воркера """
+    return Job.objects.filter(
+        status=Job.Status.RUNNING,
+        locked_at__lt=timezone.now() - datetime.timedelta(
+            seconds=settings.JOBS_LOCK_TIMEOUT
+        )
+    ).update(status=Job.Status.PENDING, locked_at=None)
+
+
+def purge_finished_jobs():
+    return Job.objects.filter(
+        status=Job.Status.DONE,
+        finished_at__lt=timezone.now() - datetime.timedelta(
+            days=settings.JOBS_KEEP_DONE_DAYS
+        )
+    ).delete()
+
+
+def schedule_periodic_jobs():
+    """ Ставим в очередь задачи из JOBS_PERIODIC, у которых подошел срок """
+    now = timezone.now()
+    for name, interval in settings.JOBS_PERIODIC.items():
+        if not Job.objects.filter(
+            Q(status__in=(Job.Status.PENDING, Job.Status.RUNNING))
+            | Q(finished_at__gt=now - datetime.timedelta(seconds=interval)),
+            name=name
+        ).exists():
+            registry[name].delay()
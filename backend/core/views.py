@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+from core.instrumentation import registry
+
+
+def metrics(request):
+    """ Метрики в формате Prometheus, без METRICS_TOKEN закрыты """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    if request.headers.get(
+        'Authorization'
+    ) != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,102 @@
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from core.db_routers import primary_db
+from core.tasks import (claim_job, purge_finished_jobs, release_stale_jobs,
+                        run_job, schedule_periodic_jobs)
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """ Обработчик очереди задач: пул потоков в процессах """
+
+    def __init__(self, threads=1, processes=1, poll_interval=None):
+        self.threads = threads
+        self.processes = processes
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL
+        self.stop_event = threading.Event()
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def loop(self):
+        """
+        Цикл потока воркера. Ошибка вне задачи (например, потеря
+        соединения с БД) не должна молча останавливать поток: она
+        пишется в лог, и цикл продолжается после паузы, которая растет
+        до JOBS_MAX_BACKOFF.
+        """
+        failures = 0
+        with primary_db():
+            while not self.stop_event.is_set():
+                try:
+                    close_old_connections()
+                    job = claim_job()
+                    if job is not None:
+                        run_job(job)
+                except Exception:
+                    failures += 1
+                    logger.exception('Ошибка в цикле воркера')
+                    connections.close_all()
+                    self.stop_event.wait(min(
+                        self.poll_interval * 2 ** failures,
+                        settings.JOBS_MAX_BACKOFF
+                    ))
+                    continue
+                failures = 0
+                if job is None:
+                    self.stop_event.wait(self.poll_interval)
+        connections.close_all()
+
+    def housekeeping(self):
+        with primary_db():
+            while not self.stop_event.wait(settings.JOBS_LOCK_TIMEOUT):
+                try:
+                    close_old_connections()
+                    released = release_stale_jobs()
+                    if released:
+                        logger.warning(
+                            'Возвращено в очередь задач: %s', released
+                        )
+                    purge_finished_jobs()
+                    schedule_periodic_jobs()
+                except Exception:
+                    logger.exception('Ошибка в обслуживании очереди')
+                    connections.close_all()
+
+    def run_threads(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            for _ in range(self.threads):
+                pool.submit(self.loop)
+
+    def run(self):
+        with primary_db():
+            release_stale_jobs()
+            schedule_periodic_jobs()
+        if self.processes == 1:
+            threading.Thread(target=self.housekeeping, daemon=True).start()
+            self.run_threads()
+            return
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [
+            context.Process(target=self.run_threads)
+            for _ in range(self.processes)
+        ]
+        for child in children:
+            child.start()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.housekeeping()
+        for child in children:
+            child.terminate()
+            child.join()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import time
+
+
+def available_cpus():
+    """ Число CPU с учетом квоты cgroup контейнера """
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != 'max':
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0))
+
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+CPUS = available_cpus()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    default_workers = CPUS + 1
+else:
+    wsgi_app = 'backend.wsgi:application'
+    worker_class = os.getenv(
+        'GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync'
+    )
+    default_workers = CPUS * 2 + 1 if threads == 1 else CPUS + 1
+
+workers = int(os.getenv('GUNICORN_WORKERS', default_workers))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Каждый запрос попадает в журнал одной строкой. В режиме WSGI ее пишет
+# post_request вместе со временем и счетчиком запросов воркера, поэтому
+# журнал доступа gunicorn выключен. UvicornWorker хуки не вызывает, там
+# строку пишет журнал доступа uvicorn
+accesslog = '-' if SERVER_MODE == 'asgi' else None
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """ Метрики прошлого запуска не должны попасть в новые счетчики """
+    if os.getenv('METRICS_DIR'):
+        shutil.rmtree(os.getenv('METRICS_DIR'), ignore_errors=True)
+
+
+def pre_request(worker, req):
+    req.started_at = time.monotonic()
+
+
+def post_request(worker, req, environ, resp):
+    worker.requests_served = getattr(worker, 'requests_served', 0) + 1
+    worker.log.info(
+        '%s "%s %s" %s %s %.1fms worker=%s request=%s',
+        environ.get('REMOTE_ADDR'),
+        req.method,
+        req.path,
+        resp.status_code,
+        resp.response_length,
+        (time.monotonic() - req.started_at) * 1000,
+        worker.pid,
+        worker.requests_served
+    )
@@ -0,0 +1,97 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.models import ChangeLog
+
+
+def record_changes(kind, action, object_ids, user_id=None):
+    ChangeLog.objects.bulk_create([
+        ChangeLog(
+            kind=kind, action=action, object_id=object_id, user_id=user_id
+        )
+        for object_id in object_ids
+    ])
+
+
+def find_gaps(start_id, end_id, now):
+    """
+    ID между start_id и end_id, которых еще нет в журнале: их транзакции
+    не закоммитились или откатились. Больше CHANGES_MAX_GAPS подряд
+    не бывает одновременно открытых транзакций, старшие ID важнее.
+    """
+    start_id = max(start_id, end_id - settings.CHANGES_MAX_GAPS)
+    return {gap_id: now for gap_id in range(start_id + 1, end_id)}
+
+
+def get_change_state():
+    """
+    Последний ID журнала и пропуски перед ним для курсора текущего
+    момента. Пропуски ищутся среди последних CHANGES_MAX_GAPS ID.
+    """
+    ids = list(ChangeLog.objects.order_by('-id').values_list(
+        'id', flat=True
+    )[:settings.CHANGES_MAX_GAPS])
+    if not ids:
+        return 0, []
+    now = int(time.time())
+    gaps = find_gaps(ids[-1] - 1, ids[0], now)
+    for change_id in ids:
+        gaps.pop(change_id, None)
+    return ids[0], sorted(gaps.items())
+
+
+def collect_changes(user, since_id, gaps, limit):
+    """
+    Итог изменений после since_id и в пропусках gaps: для каждого вида
+    объектов словарь ID -> последнее действие, ID последней записи,
+    оставшиеся пропуски и признак продолжения. Читаются только общие
+    записи и записи пользователя, по индексу (user, id).
+
+    ID журнала выдаются при вставке, а видны записи после коммита,
+    поэтому запись с меньшим ID может появиться позже курсора. ID перед
+    последней прочитанной записью, которых еще нет в журнале, курсор
+    помнит как пропуски [ID, время] и перечитывает, пока они не старше
+    CHANGES_GAP_SECONDS. Пропуск закрывается, когда запись с этим ID
+    появилась, даже если она чужая.
+    """
+    now = int(time.time())
+    gaps = {
+        gap_id: seen for gap_id, seen in gaps
+        if now - seen < settings.CHANGES_GAP_SECONDS
+    }
+    visible = Q(user__isnull=True)
+    if user is not None:
+        visible |= Q(user=user)
+    entries = list(ChangeLog.objects.filter(visible).filter(
+        Q(id__gt=since_id) | Q(id__in=list(gaps))
+    ).order_by('id').values_list(
+        'id', 'kind', 'object_id', 'action'
+    )[:limit + 1])
+    has_more = len(entries) > limit
+    changes = {kind: {} for kind in ChangeLog.Kind.values}
+    last_id = since_id
+    for change_id, kind, object_id, action in entries[:limit]:
+        changes[kind][object_id] = action
+        last_id = max(last_id, change_id)
+    # Все записи до last_id уже прочитаны: пропуски — это ID, которых
+    # нет во всем журнале
+    gaps.update(find_gaps(since_id, last_id, now))
+    if gaps:
+        for change_id in ChangeLog.objects.filter(
+            id__in=list(gaps)
+        ).values_list('id', flat=True):
+            del gaps[change_id]
+    gaps = sorted(gaps.items())[-settings.CHANGES_MAX_GAPS:]
+    return changes, last_id, gaps, has_more
+
+
+def prune_changelog():
+    return ChangeLog.objects.filter(
+        created_at__lt=timezone.now() - datetime.timedelta(
+            days=settings.CHANGES_KEEP_DAYS
+        )
+    ).delete()
@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import Signal
+
+from core.files import delete_media_files
+from recipes.changelog import record_changes
+from recipes.models import (ChangeLog, Favorite, FeedItem, IngredientsRecipes,
+                            Recipe, ShoppingCart, Subscription, TagsRecipes,
+                            User)
+
+# Отправляется после удаления рецептов в обход сборщика Django,
+# аргументы: recipe_ids и author_ids
+recipes_deleted = Signal()
+# Отправляется после удаления подписок на удаляемого автора,
+# аргументы: author_id и follower_ids
+subscriptions_deleted = Signal()
+
+# Связи рецепта в порядке удаления: сначала зависимые таблицы
+RECIPE_RELATIONS = (
+    (FeedItem, 'recipe_id'),
+    (Favorite, 'recipe_id'),
+    (ShoppingCart, 'recipe_id'),
+    (IngredientsRecipes, 'recipe_id'),
+    (TagsRecipes, 'recipe_id'),
+)
+# Связи пользователя, которые остаются после удаления его рецептов.
+# Подписки на него удаляются отдельно, чтобы известить подписчиков
+USER_RELATIONS = (
+    (FeedItem, 'follower_id'),
+    (Favorite, 'user_id'),
+    (ShoppingCart, 'user_id'),
+    (Subscription, 'follower_id'),
+    (ChangeLog, 'user_id'),
+)
+
+
+def delete_rows(model, field, values):
+    """
+    Удаляет строки model, у которых field входит в values, одним
+    DELETE ... WHERE field IN (...). У моделей без сигналов и каскадов
+    это делает сам QuerySet.delete(). Остальным строки не загружаются
+    и post_delete не отправляется: вызывающий код сам отвечает за
+    порядок удаления и за то, что делали обработчики сигналов.
+    """
+    values = list(values)
+    queryset = model.objects.filter(**{f'{field}__in': values})
+    if not values or not has_delete_receivers(model):
+        return queryset.delete()[0]
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.get_field(field).column)} '
+            f'IN ({", ".join(["%s"] * len(values))})',
+            values
+        )
+        return cursor.rowcount
+
+
+def has_delete_receivers(model):
+    return any(
+        signal.has_listeners(model)
+        for signal in (pre_delete, post_delete)
+    )
+
+
+def delete_recipes(recipe_ids):
+    """
+    Удаляет рецепты и их связи набором запросов в порядке зависимостей.
+    В журнал изменений попадают только сами рецепты, как и при каскаде,
+    а картинки удаляются одним проходом после коммита.
+    """
+    with transaction.atomic():
+        recipes = list(Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list('id', 'author_id', 'image'))
+        if not recipes:
+            return 0
+        recipe_ids = [recipe_id for recipe_id, _, _ in recipes]
+        for model, field in RECIPE_RELATIONS:
+            delete_rows(model, field, recipe_ids)
+        deleted = delete_rows(Recipe, 'id', recipe_ids)
+        record_changes(
+            ChangeLog.Kind.RECIPE, ChangeLog.Action.DELETED, recipe_ids
+        )
+        recipes_deleted.send(
+            sender=Recipe,
+            recipe_ids=recipe_ids,
+            author_ids={author_id for _, author_id, _ in recipes}
+        )
+        images = [image for _, _, image in recipes if image]
+        transaction.on_commit(lambda: delete_media_files(images))
+    return deleted
+
+
+def delete_in_chunks(queryset, chunk_size):
+    """ Удаляет строки порциями, каждая порция в своей транзакции """
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            deleted += delete_rows(queryset.model, 'id', ids)
+
+
+def delete_author_subscriptions(author_id, chunk_size):
+    """
+    Удаляет подписки на автора порциями. Подписчики узнают об отписке
+    из журнала изменений и потока событий, как при обычной отписке.
+    """
+    while True:
+        with transaction.atomic():
+            subscriptions = list(Subscription.objects.filter(
+                author_id=author_id
+            ).values_list('id', 'follower_id')[:chunk_size])
+            if not subscriptions:
+                return
+            delete_rows(Subscription, 'id', [
+                subscription_id for subscription_id, _ in subscriptions
+            ])
+            follower_ids = [follower_id for _, follower_id in subscriptions]
+            ChangeLog.objects.bulk_create([
+                ChangeLog(
+                    kind=ChangeLog.Kind.SUBSCRIPTION,
+                    action=ChangeLog.Action.DELETED,
+                    object_id=author_id,
+                    user_id=follower_id
+                )
+                for follower_id in follower_ids
+            ])
+            subscriptions_deleted.send(
+                sender=Subscription,
+                author_id=author_id,
+                follower_ids=follower_ids
+            )
+
+
+def delete_user(user_id):
+    """
+    Удаляет пользователя порциями: рецепты, затем его связи, затем
+    саму запись. Задачу можно безопасно повторить после сбоя.
+    """
+    chunk_size = settings.DELETION_CHUNK_SIZE
+    while True:
+        recipe_ids = list(Recipe.objects.filter(
+            author_id=user_id
+        ).values_list('id', flat=True)[:chunk_size])
+        if not recipe_ids:
+            break
+        delete_recipes(recipe_ids)
+    delete_author_subscriptions(user_id, chunk_size)
+    for model, field in USER_RELATIONS:
+        delete_in_chunks(model.objects.filter(**{field: user_id}), chunk_size)
+    # Оставшиеся связи (токены, группы, журнал админки) невелики
+    User.objects.filter(id=user_id).delete()
@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.db.models import Q
+
+from recipes.models import FeedItem, Recipe, Subscription
+
+FANOUT_BATCH_SIZE = 1000
+# Подписчиков в одном UPDATE: списки IN длиннее не принимает SQLite
+FILL_BATCH_SIZE = 500
+
+
+def is_fanout_author(author_id):
+    """ Рассылаем рецепт подписчикам при записи, если их не слишком много """
+    return Subscription.objects.filter(
+        author_id=author_id
+    ).count() <= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def fill_feeds(author_id, follower_ids):
+    """
+    Добавляем последние рецепты автора в ленты подписчиков и отмечаем
+    их подписки заполненными: дальше лента читает автора из FeedItem.
+    """
+    recipes = list(Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )[:settings.FEED_BACKFILL_SIZE])
+    for start in range(0, len(follower_ids), FILL_BATCH_SIZE):
+        batch = follower_ids[start:start + FILL_BATCH_SIZE]
+        FeedItem.objects.bulk_create(
+            (
+                FeedItem(
+                    follower_id=follower_id,
+                    recipe_id=recipe_id,
+                    pub_date=pub_date
+                )
+                for follower_id in batch
+                for recipe_id, pub_date in recipes
+            ),
+            batch_size=FANOUT_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        Subscription.objects.filter(
+            author_id=author_id, follower_id__in=batch
+        ).update(feed_filled=True)
+
+
+def fan_out_recipe(recipe_id):
+    """
+    Добавляем рецепт в ленты подписчиков автора. У автора со слишком
+    большим числом подписчиков ленты перестают считаться заполненными,
+    и его рецепты читаются при запросе. Когда подписчиков снова станет
+    меньше порога, незаполненные ленты заполняются заново.
+    """
+    recipe = Recipe.objects.filter(id=recipe_id).only(
+        'id', 'author_id', 'pub_date'
+    ).first()
+    if recipe is None:
+        return
+    subscriptions = Subscription.objects.filter(author_id=recipe.author_id)
+    if not is_fanout_author(recipe.author_id):
+        subscriptions.filter(feed_filled=True).update(feed_filled=False)
+        return
+    # Один снимок подписок: заполнение ленты в другом потоке не должно
+    # перенести подписчика между списками посередине
+    filled_ids, unfilled_ids = [], []
+    for follower_id, feed_filled in subscriptions.values_list(
+        'follower_id', 'feed_filled'
+    ).iterator(chunk_size=FANOUT_BATCH_SIZE):
+        (filled_ids if feed_filled else unfilled_ids).append(follower_id)
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(
+                follower_id=follower_id,
+                recipe_id=recipe.id,
+                pub_date=recipe.pub_date
+            )
+            for follower_id in filled_ids
+        ),
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    fill_feeds(recipe.author_id, unfilled_ids)
+
+
+def backfill_feed(follower_id, author_id):
+    """
+    Добавляем в ленту последние рецепты автора после подписки. Задача
+    могла выполниться уже после отписки, тогда ничего не делаем.
+    """
+    if Subscription.objects.filter(
+        follower_id=follower_id, author_id=author_id
+    ).exists() and is_fanout_author(author_id):
+        fill_feeds(author_id, [follower_id])
+
+
+def remove_from_feed(follower_id, author_id):
+    """
+    Убираем рецепты автора из ленты после отписки, если подписчик
+    не подписался снова раньше, чем выполнилась задача.
+    """
+    if Subscription.objects.filter(
+        follower_id=follower_id, author_id=author_id
+    ).exists():
+        return
+    FeedItem.objects.filter(
+        follower_id=follower_id,
+        recipe__author_id=author_id
+    ).delete()
+
+
+def get_feed_keys(user, limit, after=None):
+    """
+    Ключи (pub_date, ID рецепта) страницы ленты после ключа after
+    в порядке убывания. Авторы с заполненной лентой читаются по индексу
+    FeedItem (follower, -pub_date), остальные подписки — из рецептов
+    автора; обе выборки ограничены limit и сливаются. Отписка и удаление
+    автора скрывают его сразу, до задачи очистки ленты.
+    """
+    feed_items = FeedItem.objects.filter(
+        follower=user,
+        recipe__author_id__in=Subscription.objects.filter(
+            follower=user, feed_filled=True, author__is_active=True
+        ).values('author_id')
+    )
+    pulled = Recipe.objects.filter(
+        author_id__in=Subscription.objects.filter(
+            follower=user, feed_filled=False, author__is_active=True
+        ).values('author_id')
+    )
+    if after is not None:
+        pub_date, recipe_id = after
+        feed_items = feed_items.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+        )
+        pulled = pulled.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=recipe_id)
+        )
+    keys = list(feed_items.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit]) + list(pulled.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id'
+    )[:limit])
+    return sorted(keys, reverse=True)[:limit]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.8 on 2026-10-19 08:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(updated_at=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_feeditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Меняется и при изменении ингредиентов или тэгов', verbose_name='Дата изменения рецепта'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
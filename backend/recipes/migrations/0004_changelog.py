@@ -0,0 +1,32 @@
+# Generated by Django 4.2.8 on 2026-10-19 08:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('recipe', 'Рецепт'), ('favorite', 'Избранное'), ('shopping_cart', 'Список покупок'), ('subscription', 'Подписка')], max_length=16, verbose_name='Объект')),
+                ('action', models.CharField(choices=[('saved', 'Создан или изменен'), ('deleted', 'Удален')], max_length=8, verbose_name='Действие')),
+                ('object_id', models.PositiveBigIntegerField(help_text='ID рецепта, а для подписки ID автора', verbose_name='ID объекта')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата изменения')),
+                ('user', models.ForeignKey(blank=True, db_index=False, help_text='Пусто для изменений, которые видны всем', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='changes', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['user', 'id'], name='changelog_user_id_idx')],
+            },
+        ),
+    ]
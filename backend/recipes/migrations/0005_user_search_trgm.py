@@ -0,0 +1,56 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import (AddIndexConcurrently,
+                                                TrigramExtension)
+from django.db import migrations, models
+from django.db.models.functions import Cast, Upper
+
+# Расширение pg_trgm создает только суперпользователь. На управляемом
+# PostgreSQL его нужно включить заранее командой
+# CREATE EXTENSION pg_trgm, тогда TrigramExtension ничего не делает.
+# Индексы строятся CONCURRENTLY, чтобы не блокировать запись в
+# recipes_user во время деплоя, поэтому миграция не атомарная.
+SEARCH_COLUMNS = ('username', 'first_name', 'last_name')
+
+
+class AddPostgresIndexConcurrently(AddIndexConcurrently):
+    """ GIN-индексов в SQLite нет, там меняется только состояние моделей """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0004_changelog'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        *(
+            AddPostgresIndexConcurrently(
+                model_name='user',
+                index=GinIndex(
+                    OpClass(
+                        Upper(Cast(column, models.TextField())),
+                        name='gin_trgm_ops'
+                    ),
+                    name=f'recipes_user_{column}_trgm'
+                ),
+            )
+            for column in SEARCH_COLUMNS
+        ),
+    ]
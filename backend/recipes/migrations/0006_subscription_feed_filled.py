@@ -0,0 +1,38 @@
+# Generated by Django 4.2.8 on 2026-10-19 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_filled_feeds(apps, schema_editor):
+    """
+    Ленты подписчиков авторов, которым рецепты рассылались при записи,
+    уже заполнены. Подписки на крупных авторов остаются незаполненными:
+    их рецепты читаются при запросе.
+    """
+    Subscription = apps.get_model('recipes', 'Subscription')
+    pulled_authors = Subscription.objects.values('author_id').annotate(
+        followers=Count('id')
+    ).filter(
+        followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values('author_id')
+    Subscription.objects.exclude(author_id__in=pulled_authors).update(
+        feed_filled=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_user_search_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='feed_filled',
+            field=models.BooleanField(default=False, help_text='Рецепты автора разосланы в ленту подписчика', verbose_name='Лента заполнена'),
+        ),
+        migrations.RunPython(mark_filled_feeds, migrations.RunPython.noop),
+    ]
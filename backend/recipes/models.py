@@ -1,8 +1,10 @@
 from colorfield.fields import ColorField
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Cast, Upper
 
 import recipes.constants as constants
 
@@ -49,6 +51,19 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ('username',)
+        # Поиск пользователей идет через icontains, то есть
+        # UPPER(col::text) LIKE, поэтому триграммные индексы строятся
+        # по тому же выражению. В SQLite их нет, см. миграцию 0005
+        indexes = [
+            GinIndex(
+                OpClass(
+                    Upper(Cast(column, models.TextField())),
+                    name='gin_trgm_ops'
+                ),
+                name=f'recipes_user_{column}_trgm'
+            )
+            for column in ('username', 'first_name', 'last_name')
+        ]
 
     def __str__(self) -> str:
         return f'{self.username}'
@@ -107,6 +122,13 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def visible(self):
+        """ Без рецептов удаляемых авторов: их скрывают до задачи удаления """
+        return self.filter(author__is_active=True)
+
+
 class Recipe(models.Model):
     """ Модель рецепт """
     author = models.ForeignKey(
@@ -158,6 +180,13 @@ class Recipe(models.Model):
         verbose_name='Дата публикации рецепта',
         help_text='Дата и время публикации данного рецепта'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения рецепта',
+        help_text='Меняется и при изменении ингредиентов или тэгов'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -258,6 +287,11 @@ class Subscription(models.Model):
         verbose_name='Дата оформления подписки',
         help_text='Дата и время оформления подписки'
     )
+    feed_filled = models.BooleanField(
+        default=False,
+        verbose_name='Лента заполнена',
+        help_text='Рецепты автора разосланы в ленту подписчика'
+    )
 
     class Meta:
         verbose_name = 'Подписка'
@@ -340,3 +374,101 @@ class ShoppingCart(models.Model):
 
     def __str__(self) -> str:
         return f'Список покупок пользователя {self.user}'
+
+
+class FeedItem(models.Model):
+    """ Модель ленты рецептов подписчика """
+    follower = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+        help_text='Копия даты публикации рецепта для сортировки ленты'
+    )
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Лента рецептов'
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['follower', 'recipe'],
+                name='unique_feed_item',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['follower', '-pub_date'],
+                name='feed_follower_pub_date_idx',
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.follower} {self.recipe}'
+
+
+class ChangeLog(models.Model):
+    """ Модель журнала изменений для синхронизации клиентов """
+
+    class Kind(models.TextChoices):
+        RECIPE = 'recipe', 'Рецепт'
+        FAVORITE = 'favorite', 'Избранное'
+        SHOPPING_CART = 'shopping_cart', 'Список покупок'
+        SUBSCRIPTION = 'subscription', 'Подписка'
+
+    class Action(models.TextChoices):
+        SAVED = 'saved', 'Создан или изменен'
+        DELETED = 'deleted', 'Удален'
+
+    kind = models.CharField(
+        max_length=16,
+        choices=Kind.choices,
+        verbose_name='Объект'
+    )
+    action = models.CharField(
+        max_length=8,
+        choices=Action.choices,
+        verbose_name='Действие'
+    )
+    object_id = models.PositiveBigIntegerField(
+        verbose_name='ID объекта',
+        help_text='ID рецепта, а для подписки ID автора'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name='changes',
+        verbose_name='Пользователь',
+        help_text='Пусто для изменений, которые видны всем'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        ordering = ('id',)
+        indexes = [
+            models.Index(
+                fields=['user', 'id'],
+                name='changelog_user_id_idx',
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.kind} {self.object_id}: {self.action}'
@@ -0,0 +1,134 @@
+from django.db.models import QuerySet
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.changelog import record_changes
+from recipes.models import (ChangeLog, Favorite, Ingredient,
+                            IngredientsRecipes, Recipe, ShoppingCart,
+                            Subscription, Tag, TagsRecipes, User)
+from recipes.tasks import (backfill_feed_task, fan_out_recipe_task,
+                           remove_from_feed_task)
+
+USER_RECIPE_KINDS = {
+    Favorite: ChangeLog.Kind.FAVORITE,
+    ShoppingCart: ChangeLog.Kind.SHOPPING_CART,
+}
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipe_task.delay(recipe_id=instance.id)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        backfill_feed_task.delay(
+            follower_id=instance.follower_id,
+            author_id=instance.author_id
+        )
+        record_changes(
+            ChangeLog.Kind.SUBSCRIPTION, ChangeLog.Action.SAVED,
+            [instance.author_id], instance.follower_id
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, origin=None, **kwargs):
+    remove_from_feed_task.delay(
+        follower_id=instance.follower_id,
+        author_id=instance.author_id
+    )
+    # Журнал удаляемого пользователя удаляется вместе с ним
+    if not is_cascade_from(origin, User):
+        record_changes(
+            ChangeLog.Kind.SUBSCRIPTION, ChangeLog.Action.DELETED,
+            [instance.author_id], instance.follower_id
+        )
+
+
+def is_cascade_from(origin, model):
+    """ Удаление идет каскадом от объекта model или их набора """
+    origin_model = (
+        origin.model if isinstance(origin, QuerySet) else type(origin)
+    )
+    return issubclass(origin_model, model)
+
+
+def touch_recipes(recipe_ids):
+    """ Обновляет updated_at рецептов, у которых изменились связи """
+    recipe_ids = list(recipe_ids)
+    Recipe.objects.filter(id__in=recipe_ids).update(updated_at=timezone.now())
+    record_changes(
+        ChangeLog.Kind.RECIPE, ChangeLog.Action.SAVED, recipe_ids
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    record_changes(
+        ChangeLog.Kind.RECIPE, ChangeLog.Action.SAVED, [instance.id]
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    record_changes(
+        ChangeLog.Kind.RECIPE, ChangeLog.Action.DELETED, [instance.id]
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def user_recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        record_changes(
+            USER_RECIPE_KINDS[sender], ChangeLog.Action.SAVED,
+            [instance.recipe_id], instance.user_id
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def user_recipe_deleted(sender, instance, origin=None, **kwargs):
+    # Об удаленном рецепте клиент узнает из записи о самом рецепте
+    if not is_cascade_from(origin, (User, Recipe)):
+        record_changes(
+            USER_RECIPE_KINDS[sender], ChangeLog.Action.DELETED,
+            [instance.recipe_id], instance.user_id
+        )
+
+
+@receiver(post_save, sender=IngredientsRecipes)
+@receiver(post_save, sender=TagsRecipes)
+def recipe_relation_saved(sender, instance, **kwargs):
+    touch_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        touch_recipes(Recipe.objects.filter(tags=instance).values_list(
+            'id', flat=True
+        ))
+    elif action in ('post_add', 'post_remove', 'post_clear') and (
+        pk_set is None or pk_set
+    ):
+        touch_recipes(pk_set or () if reverse else [instance.id])
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_catalog_deleted(sender, instance, **kwargs):
+    """
+    Связи с рецептами удаляются каскадом без сигнала m2m_changed,
+    поэтому рецепты отмечаются измененными до удаления.
+    """
+    relation = TagsRecipes if sender is Tag else IngredientsRecipes
+    recipe_ids = relation.objects.filter(
+        **{sender._meta.model_name: instance}
+    ).values_list('recipe_id', flat=True)
+    touch_recipes(recipe_ids)
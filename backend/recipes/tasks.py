@@ -0,0 +1,29 @@
+from core.tasks import task
+from recipes.changelog import prune_changelog
+from recipes.deletion import delete_user
+from recipes.feed import backfill_feed, fan_out_recipe, remove_from_feed
+
+
+@task('recipes.fan_out_recipe')
+def fan_out_recipe_task(recipe_id):
+    fan_out_recipe(recipe_id)
+
+
+@task('recipes.backfill_feed')
+def backfill_feed_task(follower_id, author_id):
+    backfill_feed(follower_id, author_id)
+
+
+@task('recipes.remove_from_feed')
+def remove_from_feed_task(follower_id, author_id):
+    remove_from_feed(follower_id, author_id)
+
+
+@task('recipes.prune_changelog')
+def prune_changelog_task():
+    prune_changelog()
+
+
+@task('recipes.delete_user')
+def delete_user_task(user_id):
+    delete_user(user_id)